@@ -0,0 +1,56 @@
+"""add denormalized funding counters to wishlist_items
+
+Revision ID: 0003_item_funding_counters
+Revises: 0002_source_unavailable
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0003_item_funding_counters"
+down_revision: Union[str, None] = "0002_source_unavailable"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "wishlist_items",
+        sa.Column("reservation_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "wishlist_items",
+        sa.Column("collected_amount_cents", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "wishlist_items",
+        sa.Column("contribution_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.execute(
+        """
+        UPDATE wishlist_items SET
+            reservation_count = (
+                SELECT COUNT(*) FROM reservations r WHERE r.item_id = wishlist_items.id
+            ),
+            collected_amount_cents = (
+                SELECT COALESCE(SUM(c.amount_cents), 0)
+                FROM contributions c JOIN reservations r ON r.id = c.reservation_id
+                WHERE r.item_id = wishlist_items.id
+            ),
+            contribution_count = (
+                SELECT COUNT(*)
+                FROM contributions c JOIN reservations r ON r.id = c.reservation_id
+                WHERE r.item_id = wishlist_items.id
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("wishlist_items", "contribution_count")
+    op.drop_column("wishlist_items", "collected_amount_cents")
+    op.drop_column("wishlist_items", "reservation_count")
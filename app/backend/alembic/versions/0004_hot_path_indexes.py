@@ -0,0 +1,36 @@
+"""composite indexes for owner listings and group reservation lookups
+
+Revision ID: 0004_hot_path_indexes
+Revises: 0003_item_funding_counters
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004_hot_path_indexes"
+down_revision: Union[str, None] = "0003_item_funding_counters"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /wishlists/me и проверки владельца: WHERE owner_id = ? ORDER BY created_at DESC, id DESC
+    op.create_index(
+        "ix_wishlists_owner_id_created_at",
+        "wishlists",
+        ["owner_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+    # поиск группового резерва (item_id, is_group) и все выборки по item_id;
+    # одиночный индекс по item_id становится лишним
+    op.create_index("ix_reservations_item_id_is_group", "reservations", ["item_id", "is_group"])
+    op.drop_index("ix_reservations_item_id", table_name="reservations")
+
+
+def downgrade() -> None:
+    op.create_index("ix_reservations_item_id", "reservations", ["item_id"])
+    op.drop_index("ix_reservations_item_id_is_group", table_name="reservations")
+    op.drop_index("ix_wishlists_owner_id_created_at", table_name="wishlists")
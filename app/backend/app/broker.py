@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Protocol
+
+
+logger = logging.getLogger(__name__)
+
+# (room, text) -> None; вызывается для каждого сообщения комнаты, на которую подписан воркер
+Handler = Callable[[str, str], None]
+
+
+class Broker(Protocol):
+    # True, если сообщения не покидают процесс: тогда в пустую комнату можно не публиковать
+    local_only: bool
+
+    def set_handler(self, handler: Handler) -> None: ...
+
+    async def next_seq(self, room: str) -> int: ...
+
+    async def publish(self, room: str, text: str) -> None: ...
+
+    async def subscribe(self, room: str) -> None: ...
+
+    async def unsubscribe(self, room: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class InMemoryBroker:
+    """Доставка внутри одного процесса — для одного воркера и тестов."""
+
+    local_only = True
+
+    def __init__(self) -> None:
+        self._handler: Optional[Handler] = None
+        self._sequences: Dict[str, int] = {}
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def next_seq(self, room: str) -> int:
+        seq = self._sequences.get(room, 0) + 1
+        self._sequences[room] = seq
+        return seq
+
+    async def publish(self, room: str, text: str) -> None:
+        if self._handler is not None:
+            self._handler(room, text)
+
+    async def subscribe(self, room: str) -> None:
+        pass
+
+    async def unsubscribe(self, room: str) -> None:
+        # в комнате не осталось слушателей — нумерация начнётся заново
+        self._sequences.pop(room, None)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBroker:
+    """Redis pub/sub: канал на комнату, воркер подписан только на комнаты со своими сокетами.
+
+    Номер события выдаёт Redis (INCR), поэтому seq общий для всех воркеров.
+    """
+
+    local_only = False
+
+    def __init__(self, client: Any, prefix: str = "ws") -> None:
+        self.client = client
+        self.prefix = prefix
+        self.pubsub = client.pubsub()
+        self._handler: Optional[Handler] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBroker":
+        import redis.asyncio as redis  # опциональная зависимость
+
+        return cls(redis.Redis.from_url(url))
+
+    def _channel(self, room: str) -> str:
+        return f"{self.prefix}:room:{room}"
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def next_seq(self, room: str) -> int:
+        return int(await self.client.incr(f"{self.prefix}:seq:{room}"))
+
+    async def publish(self, room: str, text: str) -> None:
+        await self.client.publish(self._channel(room), text)
+
+    async def subscribe(self, room: str) -> None:
+        await self.pubsub.subscribe(self._channel(room))
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, room: str) -> None:
+        await self.pubsub.unsubscribe(self._channel(room))
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def _listen(self) -> None:
+        prefix = f"{self.prefix}:room:"
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime broker: ошибка чтения из Redis")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or self._handler is None:
+                continue
+            channel = message["channel"]
+            data = message["data"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            if isinstance(data, bytes):
+                data = data.decode()
+            self._handler(channel[len(prefix):], data)
@@ -0,0 +1,232 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+class CacheBackend(Protocol):
+    epoch: str
+
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def set(self, key: str, value: bytes, ttl: int) -> None: ...
+
+    def incr(self, key: str) -> int: ...
+
+    def get_counter(self, key: str) -> int: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class MemoryCacheBackend:
+    """LRU с TTL в памяти процесса. Счётчики версий хранятся отдельно и не вытесняются."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        # счётчики обнуляются при рестарте, поэтому ETag включает метку процесса
+        self.epoch = secrets.token_hex(4)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend:
+    """Бэкенд поверх redis-совместимого клиента (redis-py, fakeredis)."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.epoch = "r"
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        import redis  # опциональная зависимость
+
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def get_counter(self, key: str) -> int:
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+class WishlistCache:
+    """Read-through кэш сериализованных ответов, привязанный к версии вишлиста.
+
+    Запись хранит id вишлиста и версию, с которой она была построена. Любая
+    запись в вишлист увеличивает версию, и старые записи перестают совпадать.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int, namespace: str = "wl") -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def _version_key(self, wishlist_id: int) -> str:
+        return f"{self.namespace}:ver:{wishlist_id}"
+
+    def version(self, wishlist_id: int) -> int:
+        return self.backend.get_counter(self._version_key(wishlist_id))
+
+    def bump(self, wishlist_id: int) -> int:
+        return self.backend.incr(self._version_key(wishlist_id))
+
+    def owner_version(self, owner_id: int) -> int:
+        return self.backend.get_counter(f"{self.namespace}:owner:{owner_id}")
+
+    def bump_owner(self, owner_id: int) -> int:
+        return self.backend.incr(f"{self.namespace}:owner:{owner_id}")
+
+    def etag(self, scope: str, key: int, version: int) -> str:
+        return f'"{scope}-{self.backend.epoch}-{key}-{version}"'
+
+    def get(self, key: str) -> Optional[Tuple[int, int, bytes]]:
+        """Возвращает (wishlist_id, version, body), если запись актуальна."""
+        raw = self.backend.get(f"{self.namespace}:{key}")
+        if raw is not None:
+            header, _, body = raw.partition(b"\n")
+            wishlist_id, _, version = header.partition(b":")
+            if int(version) == self.version(int(wishlist_id)):
+                self.hits += 1
+                return int(wishlist_id), int(version), body
+        self.misses += 1
+        return None
+
+    def set(self, key: str, wishlist_id: int, version: int, body: bytes) -> None:
+        header = f"{wishlist_id}:{version}\n".encode()
+        self.backend.set(f"{self.namespace}:{key}", header + body, self.ttl)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class UserCache:
+    """Кэш личности пользователя (id, email, created_at) по subject токена.
+
+    Пароль и прочие поля не кэшируются. После изменения аккаунта запись
+    сбрасывается через invalidate_user; TTL ограничивает устаревание
+    на остальных воркерах, если бэкенд в памяти процесса.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int, namespace: str = "user") -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sub: str) -> Optional[Dict[str, Any]]:
+        raw = self.backend.get(f"{self.namespace}:{sub}")
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, sub: str, identity: Dict[str, Any]) -> None:
+        self.backend.set(f"{self.namespace}:{sub}", json.dumps(identity).encode(), self.ttl)
+
+    def invalidate(self, sub: str) -> None:
+        self.backend.delete(f"{self.namespace}:{sub}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def _build_backend(max_entries: int) -> CacheBackend:
+    if settings.cache_backend == "redis":
+        return RedisCacheBackend.from_url(settings.cache_url)
+    return MemoryCacheBackend(max_entries=max_entries)
+
+
+public_cache = WishlistCache(_build_backend(settings.cache_max_entries), ttl=settings.cache_ttl_seconds)
+user_cache = UserCache(_build_backend(settings.user_cache_max_entries), ttl=settings.user_cache_ttl_seconds)
+
+
+def invalidate_wishlist(wishlist_id: int) -> None:
+    """Вызывается обработчиками записи после commit."""
+    public_cache.bump(wishlist_id)
+
+
+def invalidate_user(sub: str) -> None:
+    """Вызывается после изменения или удаления аккаунта."""
+    user_cache.invalidate(sub)
+
+
+# Redis-клиент синхронный: из async-обработчиков обращения к нему уходят в threadpool,
+# чтобы сетевой запрос не блокировал event loop. Кэш в памяти вызывается напрямую.
+
+
+async def invalidate_wishlist_async(wishlist_id: int) -> None:
+    if isinstance(public_cache.backend, MemoryCacheBackend):
+        invalidate_wishlist(wishlist_id)
+    else:
+        await run_in_threadpool(invalidate_wishlist, wishlist_id)
+
+
+async def invalidate_user_async(sub: str) -> None:
+    if isinstance(user_cache.backend, MemoryCacheBackend):
+        invalidate_user(sub)
+    else:
+        await run_in_threadpool(invalidate_user, sub)
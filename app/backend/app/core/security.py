@@ -1,5 +1,10 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -7,8 +12,15 @@ from passlib.context import CryptContext
 from app.core.config import settings
 
 
-# Инициализируем CryptContext с bcrypt для безопасного хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Инициализируем CryptContext с bcrypt для безопасного хеширования паролей.
+# Хеши с другой стоимостью считаются устаревшими и перехешируются при входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 ALGORITHM = "HS256"
 
 
@@ -20,6 +32,98 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+
+class HashingStats:
+    """Время ожидания слота и время самого хеширования."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, run: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += run
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "avg_queue_ms": round(self.total_wait / self.calls * 1000, 3) if self.calls else 0.0,
+                "max_queue_ms": round(self.max_wait * 1000, 3),
+                "avg_hash_ms": round(self.total_run / self.calls * 1000, 3) if self.calls else 0.0,
+            }
+
+
+hashing_stats = HashingStats()
+_executor: Optional[Executor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_executor() -> Executor:
+    # отдельный пул, чтобы bcrypt не занимал threadpool синхронных обработчиков;
+    # процессы к тому же не упираются в GIL
+    global _executor
+    if _executor is None:
+        workers = settings.password_hash_workers
+        if settings.password_hash_executor == "thread":
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        else:
+            # spawn: fork процесса с работающим event loop и потоками небезопасен
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _executor
+
+
+async def _run_hashing(func: Any, *args: Any) -> Any:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.password_hash_workers)
+    queued_at = time.perf_counter()
+    hashing_stats.waiting += 1
+    async with _semaphore:
+        hashing_stats.waiting -= 1
+        hashing_stats.in_flight += 1
+        started_at = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+        finally:
+            hashing_stats.in_flight -= 1
+            hashing_stats.record(started_at - queued_at, time.perf_counter() - started_at)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля вне event loop; вторым элементом — новый хеш, если старый устарел."""
+    ok = await _run_hashing(verify_password, plain_password, hashed_password)
+    if ok and password_needs_rehash(hashed_password):
+        return ok, await hash_password_async(plain_password)
+    return ok, None
+
+
+def shutdown_hashing() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
 def create_access_token(data: dict[str, Any], expires_minutes: Optional[int] = None) -> str:
     to_encode = data.copy()
     expire_minutes = expires_minutes or settings.access_token_expire_minutes
@@ -35,4 +139,3 @@ def decode_token(token: str) -> Optional[dict[str, Any]]:
         return payload
     except JWTError:
         return None
-
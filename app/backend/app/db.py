@@ -1,5 +1,12 @@
+import threading
+import time
+import uuid
+from typing import Any
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.core.config import settings
 
@@ -8,10 +15,140 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(settings.database_url, future=True)
+class PoolWaitStats:
+    """Сколько раз и как долго запросы ждали соединение из пула."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    wait_stats = PoolWaitStats()
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    wait_stats = PoolWaitStats()
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+
+def _pool_options() -> dict[str, Any]:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _sync_connect_args() -> dict[str, Any]:
+    # PgBouncer (transaction pooling) не принимает startup-параметры вроде options,
+    # там statement_timeout задаётся на стороне роли/пулера
+    if settings.db_statement_timeout_ms and not settings.db_pgbouncer:
+        return {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+    return {}
+
+
+def _async_connect_args(url: str) -> dict[str, Any]:
+    if not url.startswith("postgresql+asyncpg://"):
+        return {}
+    if settings.db_pgbouncer:
+        # без серверных prepared statements: соединение PgBouncer может
+        # достаться другому клиенту между транзакциями
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    if settings.db_statement_timeout_ms:
+        return {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+    return {}
+
+
+engine = create_engine(
+    settings.database_url,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    connect_args=_sync_connect_args(),
+    **_pool_options(),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
 
+def _async_database_url(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://... (драйвер для AsyncSession)."""
+    url = url.replace("postgres://", "postgresql://", 1)
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+_async_url = settings.async_database_url or _async_database_url(settings.database_url)
+
+# Асинхронный движок для async-обработчиков: запросы не блокируют event loop,
+# который обслуживает и WebSocket-соединения
+async_engine = create_async_engine(
+    _async_url,
+    poolclass=InstrumentedAsyncPool,
+    connect_args=_async_connect_args(_async_url),
+    **_pool_options(),
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def _pool_status(pool: Any) -> dict:
+    capacity = settings.db_pool_size + settings.db_max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "utilization": round(checked_out / capacity, 4) if capacity else 0.0,
+        **pool.wait_stats.snapshot(),
+    }
+
+
+def pool_stats() -> dict:
+    """Загрузка пулов соединений для /metrics."""
+    return {
+        "sync": _pool_status(engine.pool),
+        "async": _pool_status(async_engine.sync_engine.pool),
+    }
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -19,3 +156,7 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
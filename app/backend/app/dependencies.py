@@ -1,11 +1,15 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
+from app.cache import user_cache
 from app.core.config import settings
 from app.core.security import decode_token
-from app.db import get_db
+from app.db import SessionLocal, get_db
 from app.models import User
 from app.schemas import TokenData
 
@@ -13,29 +17,63 @@ from app.schemas import TokenData
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _token_data(token: str) -> TokenData:
+    payload = decode_token(token)
+    if payload is None:
+        raise _credentials_exception()
     try:
-        payload = decode_token(token)
-        if payload is None:
-            raise credentials_exception
-        sub: str | None = payload.get("sub")  # type: ignore[assignment]
-        if sub is None:
-            raise credentials_exception
-        token_data = TokenData(sub=sub)
-    except JWTError:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.email == token_data.sub).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        return TokenData(**payload)
+    except ValidationError:
+        raise _credentials_exception()
+
+
+def _identity(db: Session, sub: str) -> Optional[Dict[str, Any]]:
+    """id, email и created_at пользователя: из кэша, при промахе — одним запросом."""
+    identity = user_cache.get(sub)
+    if identity is None:
+        row = db.query(User.id, User.email, User.created_at).filter(User.email == sub).first()
+        if row is None:
+            return None
+        identity = {"id": row.id, "email": row.email, "created_at": row.created_at.isoformat()}
+        user_cache.set(sub, identity)
+    return identity
+
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    token_data = _token_data(token)
+    identity = _identity(db, token_data.sub)
+    if identity is None:
+        raise _credentials_exception()
+    # объект не привязан к сессии: только для чтения полей, не для записи
+    return User(
+        id=identity["id"],
+        email=identity["email"],
+        created_at=datetime.fromisoformat(identity["created_at"]),
+    )
+
+
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """id пользователя для проверок владения — из claim uid, без обращения к БД.
+
+    Для токенов, выданных до появления uid, id берётся из кэша пользователей.
+    """
+    token_data = _token_data(token)
+    if token_data.uid is not None:
+        return token_data.uid
+    with SessionLocal() as db:
+        identity = _identity(db, token_data.sub)
+    if identity is None:
+        raise _credentials_exception()
+    return identity["id"]
 
 
 def get_settings() -> settings.__class__:
     return settings
-
@@ -1,7 +1,13 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.cache import public_cache, user_cache
 from app.core.config import settings
+from app.core.security import hashing_stats, shutdown_hashing
+from app.db import pool_stats
+from app.realtime import manager
 from app.routers import auth, wishlists, items, reservations, ws
 
 try:
@@ -14,6 +20,26 @@ except ImportError as e:
 
 
 app = FastAPI(title=settings.app_name)
+_background_tasks: list[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    if settings.revalidation_enabled and _has_preview:
+        from app.revalidation import run_revalidation_loop
+
+        _background_tasks.append(asyncio.create_task(run_revalidation_loop()))
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    for task in _background_tasks:
+        task.cancel()
+    await manager.close()
+    shutdown_hashing()
+    if _has_preview:
+        await preview.close_client()
+
 
 # Регистрируем корень и health первыми, чтобы не было 404
 @app.get("/", tags=["root"])
@@ -31,6 +57,19 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["health"])
+def metrics():
+    """Счётчики кэшей и внутренних очередей для мониторинга"""
+    return {
+        "public_cache": public_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "realtime": manager.stats(),
+        "db_pool": pool_stats(),
+        "password_hashing": hashing_stats.snapshot(),
+        "preview": preview.preview_stats() if _has_preview else None,
+    }
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
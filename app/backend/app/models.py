@@ -8,6 +8,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -54,6 +55,15 @@ class Wishlist(Base):
     )
 
 
+# список вишлистов владельца: WHERE owner_id = ? ORDER BY created_at DESC, id DESC
+Index(
+    "ix_wishlists_owner_id_created_at",
+    Wishlist.owner_id,
+    Wishlist.created_at.desc(),
+    Wishlist.id.desc(),
+)
+
+
 class WishlistItem(Base):
     __tablename__ = "wishlist_items"
 
@@ -69,6 +79,11 @@ class WishlistItem(Base):
     target_amount_cents: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     min_contribution_cents: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     source_unavailable: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # денормализованные счётчики, обновляются в той же транзакции, что и резервы/вклады
+    # (app/routers/reservations.py); сверка с исходными таблицами — python -m app.reconcile
+    reservation_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    collected_amount_cents: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    contribution_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.utcnow, nullable=False
     )
@@ -95,7 +110,7 @@ class Reservation(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     item_id: Mapped[int] = mapped_column(
-        ForeignKey("wishlist_items.id", ondelete="CASCADE"), nullable=False, index=True
+        ForeignKey("wishlist_items.id", ondelete="CASCADE"), nullable=False
     )
     reserver_name: Mapped[str] = mapped_column(String(255), nullable=False)
     message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -109,6 +124,11 @@ class Reservation(Base):
         "Contribution", back_populates="reservation", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # покрывает и выборки по item_id, и поиск группового резерва
+        Index("ix_reservations_item_id_is_group", "item_id", "is_group"),
+    )
+
 
 class Contribution(Base):
     __tablename__ = "contributions"
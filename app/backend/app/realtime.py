@@ -1,37 +1,340 @@
-from typing import Dict, List
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Union
 
 from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+
+from app.broker import Broker, InMemoryBroker, RedisBroker
+from app.core.config import settings
+
+
+try:
+    import orjson
+except ImportError:  # без orjson — стандартный json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # бинарные кадры доступны, только если установлен msgpack
+    msgpack = None
+
+
+logger = logging.getLogger(__name__)
+
+JSON_SUBPROTOCOL = "json"
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+Frame = Union[str, bytes]
+
+
+def _dumps_json(message: dict) -> str:
+    return json.dumps(jsonable_encoder(message))
+
+
+def _dumps_orjson(message: dict) -> str:
+    # datetime и dict orjson кодирует сам; jsonable_encoder — только для остального
+    return orjson.dumps(message, default=jsonable_encoder).decode()
+
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _build_serializer(name: str) -> Callable[[dict], str]:
+    if name == "orjson" and orjson is not None:
+        return _dumps_orjson
+    return _dumps_json
+
+
+def negotiate_subprotocol(offered: List[str]) -> Optional[str]:
+    """Первый из предложенных клиентом подпротоколов, который поддерживает сервер."""
+    for name in offered:
+        if name == MSGPACK_SUBPROTOCOL and msgpack is not None:
+            return name
+        if name == JSON_SUBPROTOCOL:
+            return name
+    return None
+
+
+class Connection:
+    """Сокет с собственной очередью исходящих сообщений и задачей-писателем."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, binary: bool = False) -> None:
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize=queue_size)
+        # True — клиент выбрал подпротокол msgpack и получает бинарные кадры
+        self.binary = binary
+        self.writer: Optional[asyncio.Task] = None
+        # время последнего входящего сообщения (в т.ч. ответа на heartbeat)
+        self.last_seen = time.monotonic()
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
 
 
 class ConnectionManager:
-    def __init__(self) -> None:
-        # room_id -> list[WebSocket]
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(
+        self,
+        broker: Optional[Broker] = None,
+        queue_size: int = 64,
+        slow_consumer_policy: str = "drop",
+        coalesce_window_ms: int = 0,
+        serializer: Optional[Callable[[dict], str]] = None,
+        ping_interval: float = 0,
+        idle_timeout: float = 0,
+        max_connections_per_room: int = 0,
+        max_connections: int = 0,
+    ) -> None:
+        # room_id -> {id(websocket): Connection} — только сокеты этого процесса;
+        # WebSocket в Starlette нехешируемый (Mapping), поэтому ключ — id().
+        # Обратный индекс id(websocket) -> комнаты: подключение и отключение за O(1)
+        self.active_connections: Dict[str, Dict[int, Connection]] = {}
+        self._socket_rooms: Dict[int, Set[str]] = {}
+        # брокер разносит сообщения между воркерами и выдаёт номер события (seq);
+        # клиент по разрыву в seq понимает, что пропустил патч, и перезагружает вишлист
+        self.broker: Broker = broker or InMemoryBroker()
+        self.broker.set_handler(self.deliver)
+        self.queue_size = queue_size
+        # "drop" — пропустить сообщение для медленного клиента (он увидит разрыв seq),
+        # "disconnect" — закрыть его сокет
+        self.slow_consumer_policy = slow_consumer_policy
+        self.dropped_messages = 0
+        self.slow_disconnects = 0
+        # события комнаты за окно склеиваются в одно сообщение {"type": "batch", "events": [...]};
+        # 0 — отправлять каждое событие сразу
+        self.coalesce_window = coalesce_window_ms / 1000
+        self._pending: Dict[str, List[dict]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
+        self.events_in = 0
+        self.frames_out = 0
+        # через брокер ходит JSON-текст; в msgpack перекодируется один раз на сообщение в deliver
+        self.serializer = serializer or _dumps_json
+        # heartbeat: раз в ping_interval всем сокетам уходит {"type": "ping"}; сокет, от которого
+        # idle_timeout секунд ничего не приходило, закрывается (полуоткрытые мобильные соединения)
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat: Optional[asyncio.Task] = None
+        # loop держит на задачи только слабые ссылки: фоновые отписки и закрытия
+        # хранятся здесь, пока не завершатся, иначе GC может снять их на середине
+        self._background: Set[asyncio.Task] = set()
+        # 0 — без ограничения
+        self.max_connections_per_room = max_connections_per_room
+        self.max_connections = max_connections
+        self.connection_count = 0
+        self.rejected_connections = 0
+        self.reaped_connections = 0
 
-    async def connect(self, room: str, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self.active_connections.setdefault(room, []).append(websocket)
+    async def connect(
+        self, room: str, websocket: WebSocket, subprotocol: Optional[str] = None
+    ) -> Optional[Connection]:
+        """Принимает сокет; None — лимит соединений исчерпан и рукопожатие отклонено."""
+        room_size = len(self.active_connections.get(room, ()))
+        if (self.max_connections and self.connection_count >= self.max_connections) or (
+            self.max_connections_per_room and room_size >= self.max_connections_per_room
+        ):
+            self.rejected_connections += 1
+            # close до accept — клиент получит 403 на рукопожатие
+            await websocket.close(code=1013)
+            return None
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(websocket, self.queue_size, binary=subprotocol == MSGPACK_SUBPROTOCOL)
+        connection.writer = asyncio.create_task(self._writer(room, connection))
+        is_new_room = room not in self.active_connections
+        # комнату регистрируем до подписки, чтобы параллельный _release её не снял
+        self.active_connections.setdefault(room, {})[id(websocket)] = connection
+        self._socket_rooms.setdefault(id(websocket), set()).add(room)
+        self.connection_count += 1
+        if self._heartbeat is None and self.ping_interval > 0:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+        if is_new_room:
+            try:
+                await self.broker.subscribe(room)
+            except Exception:
+                # без подписки сокет ничего не получит: снимаем регистрацию и писателя
+                self.disconnect(room, websocket)
+                raise
+        return connection
 
     def disconnect(self, room: str, websocket: WebSocket) -> None:
-        if room in self.active_connections:
-            self.active_connections[room] = [
-                ws for ws in self.active_connections[room] if ws is not websocket
-            ]
-            if not self.active_connections[room]:
-                del self.active_connections[room]
+        connections = self.active_connections.get(room)
+        connection = connections.pop(id(websocket), None) if connections is not None else None
+        if connection is None:
+            return
+        self._stop_writer(connection)
+        self.connection_count -= 1
+        rooms = self._socket_rooms.get(id(websocket))
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._socket_rooms[id(websocket)]
+        if not connections:
+            del self.active_connections[room]
+            self._spawn(self._release(room))
+
+    def disconnect_all(self, websocket: WebSocket) -> None:
+        """Снимает сокет со всех комнат по обратному индексу."""
+        for room in list(self._socket_rooms.get(id(websocket), ())):
+            self.disconnect(room, websocket)
 
     async def broadcast(self, room: str, message: dict) -> None:
+        """Публикует сообщение через брокер; отправка сокетам идёт в фоне."""
+        if self.broker.local_only and room not in self.active_connections:
+            return
+        self.events_in += 1
+        if self.coalesce_window <= 0:
+            await self._publish(room, message)
+            return
+        self._pending.setdefault(room, []).append(message)
+        if room not in self._flushers:
+            self._flushers[room] = asyncio.create_task(self._flush_later(room))
+
+    def deliver(self, room: str, text: str) -> None:
+        """Ставит сообщение в очереди локальных сокетов комнаты, не дожидаясь отправки."""
         if room not in self.active_connections:
             return
-        dead: List[WebSocket] = []
-        for connection in self.active_connections[room]:
+        slow: List[Connection] = []
+        packed: Optional[bytes] = None
+        for connection in self.active_connections[room].values():
+            frame: Frame = text
+            if connection.binary:
+                if packed is None:
+                    packed = msgpack.packb(_loads(text))
+                frame = packed
+            try:
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.dropped_messages += 1
+                slow.append(connection)
+        if self.slow_consumer_policy == "disconnect":
+            for connection in slow:
+                self.slow_disconnects += 1
+                self.disconnect(room, connection.websocket)
+                self._spawn(self._close(connection.websocket))
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.active_connections),
+            "connections": self.connection_count,
+            "largest_room": max((len(c) for c in self.active_connections.values()), default=0),
+            "rejected_connections": self.rejected_connections,
+            "reaped_connections": self.reaped_connections,
+            "dropped_messages": self.dropped_messages,
+            "slow_disconnects": self.slow_disconnects,
+            "events_in": self.events_in,
+            "frames_out": self.frames_out,
+        }
+
+    async def close(self) -> None:
+        for flusher in self._flushers.values():
+            flusher.cancel()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        await self.broker.close()
+
+    async def _publish(self, room: str, message: dict) -> None:
+        # broadcast зовут после commit: сбой брокера не должен превращать запрос в 500
+        try:
+            seq = await self.broker.next_seq(room)
+            # сериализуем один раз на сообщение, а не на каждый сокет
+            text = self.serializer({**message, "seq": seq})
+            self.frames_out += 1
+            await self.broker.publish(room, text)
+        except Exception:
+            logger.exception("Realtime: не удалось отправить события комнаты %s", room)
+
+    async def _flush_later(self, room: str) -> None:
+        await asyncio.sleep(self.coalesce_window)
+        del self._flushers[room]
+        events = self._pending.pop(room)
+        # одиночное событие уходит как есть, чтобы не менять формат без нужды
+        message = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        await self._publish(room, message)
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
             try:
-                await connection.send_json(message)
+                self._sweep()
             except Exception:
-                dead.append(connection)
-        for ws in dead:
-            self.disconnect(room, ws)
+                logger.exception("Realtime: ошибка heartbeat")
+
+    def _sweep(self) -> None:
+        text = self.serializer({"type": "ping"})
+        packed: Optional[bytes] = None
+        deadline = time.monotonic() - self.idle_timeout
+        for room, connections in list(self.active_connections.items()):
+            for connection in list(connections.values()):
+                if self.idle_timeout and connection.last_seen < deadline:
+                    self.reaped_connections += 1
+                    self.disconnect(room, connection.websocket)
+                    # 1001 Going Away: клиент переподключится
+                    self._spawn(self._close(connection.websocket, code=1001))
+                    continue
+                frame: Frame = text
+                if connection.binary:
+                    if packed is None:
+                        packed = msgpack.packb(_loads(text))
+                    frame = packed
+                try:
+                    connection.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    # очередь полна — клиент и так получит сообщения, ping ему не нужен
+                    pass
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _release(self, room: str) -> None:
+        # за время ожидания в комнату мог зайти новый сокет
+        if room not in self.active_connections:
+            await self.broker.unsubscribe(room)
+
+    async def _writer(self, room: str, connection: Connection) -> None:
+        while True:
+            frame = await connection.queue.get()
+            try:
+                if isinstance(frame, bytes):
+                    await connection.websocket.send_bytes(frame)
+                else:
+                    await connection.websocket.send_text(frame)
+            except Exception:
+                self.disconnect(room, connection.websocket)
+                return
+
+    @staticmethod
+    def _stop_writer(connection: Connection) -> None:
+        writer = connection.writer
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int = 1013) -> None:
+        try:
+            # 1013 Try Again Later: клиент переподключится и загрузит вишлист заново
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
 
+def _build_broker() -> Broker:
+    if settings.realtime_broker == "redis":
+        return RedisBroker.from_url(settings.realtime_broker_url)
+    return InMemoryBroker()
 
-manager = ConnectionManager()
 
+manager = ConnectionManager(
+    broker=_build_broker(),
+    queue_size=settings.ws_send_queue_size,
+    slow_consumer_policy=settings.ws_slow_consumer_policy,
+    coalesce_window_ms=settings.ws_coalesce_window_ms,
+    serializer=_build_serializer(settings.ws_serializer),
+    ping_interval=settings.ws_ping_interval_seconds,
+    idle_timeout=settings.ws_idle_timeout_seconds,
+    max_connections_per_room=settings.ws_max_connections_per_room,
+    max_connections=settings.ws_max_connections,
+)
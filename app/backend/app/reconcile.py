@@ -0,0 +1,122 @@
+"""Сверка денормализованных счётчиков wishlist_items с резервами и вкладами.
+
+    python -m app.reconcile          # только отчёт о расхождениях
+    python -m app.reconcile --fix    # отчёт и пересчёт найденных товаров одним UPDATE
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.cache import invalidate_wishlist
+from app.db import SessionLocal
+from app.models import Contribution, Reservation, WishlistItem
+
+
+def find_drift(db: Session) -> list[dict]:
+    """Товары, у которых счётчики не совпадают с фактическими данными (один запрос)."""
+    reservations = (
+        select(Reservation.item_id, func.count(Reservation.id).label("reservation_count"))
+        .group_by(Reservation.item_id)
+        .subquery()
+    )
+    contributions = (
+        select(
+            Reservation.item_id,
+            func.sum(Contribution.amount_cents).label("collected_amount_cents"),
+            func.count(Contribution.id).label("contribution_count"),
+        )
+        .join(Contribution, Contribution.reservation_id == Reservation.id)
+        .group_by(Reservation.item_id)
+        .subquery()
+    )
+    actual_reservations = func.coalesce(reservations.c.reservation_count, 0)
+    actual_collected = func.coalesce(contributions.c.collected_amount_cents, 0)
+    actual_contributions = func.coalesce(contributions.c.contribution_count, 0)
+    rows = db.execute(
+        select(
+            WishlistItem.id,
+            WishlistItem.wishlist_id,
+            actual_reservations,
+            actual_collected,
+            actual_contributions,
+        )
+        .outerjoin(reservations, reservations.c.item_id == WishlistItem.id)
+        .outerjoin(contributions, contributions.c.item_id == WishlistItem.id)
+        .where(
+            or_(
+                WishlistItem.reservation_count != actual_reservations,
+                WishlistItem.collected_amount_cents != actual_collected,
+                WishlistItem.contribution_count != actual_contributions,
+            )
+        )
+    ).all()
+    return [
+        {
+            "id": item_id,
+            "wishlist_id": wishlist_id,
+            "reservation_count": reservation_count,
+            "collected_amount_cents": collected,
+            "contribution_count": contribution_count,
+        }
+        for item_id, wishlist_id, reservation_count, collected, contribution_count in rows
+    ]
+
+
+def _item_contributions(column):
+    """Агрегат по вкладам товара — подзапрос, связанный с обновляемой строкой wishlist_items."""
+    return (
+        select(column)
+        .join(Reservation, Reservation.id == Contribution.reservation_id)
+        .where(Reservation.item_id == WishlistItem.id)
+        .scalar_subquery()
+    )
+
+
+def repair(db: Session, drift: list[dict]) -> None:
+    if not drift:
+        return
+    ids = [row["id"] for row in drift]
+    # строки товаров блокируются, как в reserve/contribute: резервы и вклады этих
+    # товаров ждут конца пересчёта, а все начатые до блокировки уже закоммичены
+    db.execute(select(WishlistItem.id).where(WishlistItem.id.in_(ids)).order_by(WishlistItem.id).with_for_update())
+    # значения считаются в самом UPDATE, а не берутся из отчёта find_drift — он мог устареть
+    db.execute(
+        update(WishlistItem)
+        .where(WishlistItem.id.in_(ids))
+        .values(
+            reservation_count=select(func.count(Reservation.id))
+            .where(Reservation.item_id == WishlistItem.id)
+            .scalar_subquery(),
+            collected_amount_cents=_item_contributions(func.coalesce(func.sum(Contribution.amount_cents), 0)),
+            contribution_count=_item_contributions(func.count(Contribution.id)),
+        )
+    )
+    db.commit()
+    for wishlist_id in {row["wishlist_id"] for row in drift}:
+        invalidate_wishlist(wishlist_id)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="исправить найденные расхождения")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        drift = find_drift(db)
+        for row in drift:
+            print(
+                f"item {row['id']}: reservations={row['reservation_count']} "
+                f"collected={row['collected_amount_cents']} contributions={row['contribution_count']}"
+            )
+        print(f"{len(drift)} item(s) with drift")
+        if args.fix:
+            repair(db, drift)
+            print("fixed")
+    return 1 if drift and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
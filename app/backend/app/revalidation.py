@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import bindparam, select, update
+
+from app.cache import invalidate_wishlist_async
+from app.core.config import settings
+from app.db import AsyncSessionLocal
+from app.models import WishlistItem
+from app.realtime import manager
+from app.routers.preview import check_source
+
+
+logger = logging.getLogger(__name__)
+
+# schema.org availability и типичные значения product:availability
+UNAVAILABLE_STATES = {"outofstock", "out of stock", "soldout", "discontinued", "oos"}
+GONE_STATUS_CODES = {404, 410}
+
+
+class HostRateLimiter:
+    """Не чаще одного запроса к хосту в min_interval секунд."""
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._last: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str, semaphore: asyncio.Semaphore) -> AsyncIterator[None]:
+        """Очередь хоста, затем место в общем semaphore.
+
+        Паузу между запросами к хосту ждём без места в semaphore, чтобы медленный
+        хост не занимал его у остальных; интервал отсчитывается от старта запроса.
+        """
+        async with self._locks[host]:
+            delay = self._last.get(host, 0.0) + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await semaphore.acquire()
+            self._last[host] = time.monotonic()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+async def _check_item(
+    row: WishlistItem, semaphore: asyncio.Semaphore, limiter: HostRateLimiter
+) -> Optional[dict]:
+    """Изменения для товара или None, если менять нечего (или источник не ответил)."""
+    if not row.url.startswith(("http://", "https://")):
+        return None
+    async with limiter.slot(urlparse(row.url).netloc.lower(), semaphore):
+        status = await check_source(row.url)
+    if status is None:
+        return None
+    unavailable = status["status_code"] in GONE_STATUS_CODES or (
+        (status["availability"] or "").lower() in UNAVAILABLE_STATES
+    )
+    if status["status_code"] >= 400 and not unavailable:
+        # 5xx, 403 от антибота и т.п. — не повод помечать товар недоступным
+        return None
+    price_cents = status["price_cents"] if status["price_cents"] is not None else row.price_cents
+    if unavailable == row.source_unavailable and price_cents == row.price_cents:
+        return None
+    return {
+        "id": row.id,
+        "wishlist_id": row.wishlist_id,
+        "source_unavailable": unavailable,
+        "price_cents": price_cents,
+    }
+
+
+async def revalidate_batch(rows: List[WishlistItem], limiter: HostRateLimiter) -> List[dict]:
+    semaphore = asyncio.Semaphore(settings.revalidation_concurrency)
+    results = await asyncio.gather(
+        *(_check_item(row, semaphore, limiter) for row in rows), return_exceptions=True
+    )
+    changes = []
+    params = []
+    for row, result in zip(rows, results):
+        if isinstance(result, BaseException):
+            # одна битая ссылка не должна срывать проход по остальным товарам
+            logger.warning("Source revalidation skipped item %s", row.id, exc_info=result)
+        elif result is not None:
+            changes.append(result)
+            params.append(
+                {
+                    "item_id": row.id,
+                    "read_price_cents": row.price_cents,
+                    "read_source_unavailable": row.source_unavailable,
+                    "new_price_cents": result["price_cents"],
+                    "new_source_unavailable": result["source_unavailable"],
+                }
+            )
+    if not changes:
+        return []
+
+    items = WishlistItem.__table__
+    async with AsyncSessionLocal() as db:
+        # bulk UPDATE одним executemany; строку, которую владелец успел поменять
+        # после чтения батча, не трогаем — проверка идёт до ответа источника
+        await db.execute(
+            update(items)
+            .where(
+                items.c.id == bindparam("item_id"),
+                items.c.price_cents.is_not_distinct_from(bindparam("read_price_cents")),
+                items.c.source_unavailable == bindparam("read_source_unavailable"),
+            )
+            .values(
+                price_cents=bindparam("new_price_cents"),
+                source_unavailable=bindparam("new_source_unavailable"),
+            ),
+            params,
+        )
+        # rowcount у executemany общий, поэтому применённые строки видны по их значениям
+        current = set(
+            (
+                await db.execute(
+                    select(WishlistItem.id, WishlistItem.source_unavailable, WishlistItem.price_cents).where(
+                        WishlistItem.id.in_([c["id"] for c in changes])
+                    )
+                )
+            ).all()
+        )
+        await db.commit()
+    changes = [c for c in changes if (c["id"], c["source_unavailable"], c["price_cents"]) in current]
+    if not changes:
+        return []
+
+    by_wishlist: Dict[int, List[dict]] = defaultdict(list)
+    for change in changes:
+        by_wishlist[change["wishlist_id"]].append(change)
+    for wishlist_id, items in by_wishlist.items():
+        await invalidate_wishlist_async(wishlist_id)
+        await manager.broadcast(
+            str(wishlist_id),
+            {"type": "items_revalidated", "item_ids": [c["id"] for c in items]},
+        )
+    return changes
+
+
+async def revalidate_all() -> int:
+    """Один проход по всем товарам со ссылкой; возвращает число изменённых товаров."""
+    limiter = HostRateLimiter(settings.revalidation_host_interval_seconds)
+    last_id = 0
+    changed = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.scalars(
+                    select(WishlistItem)
+                    .where(WishlistItem.url.isnot(None), WishlistItem.id > last_id)
+                    .order_by(WishlistItem.id)
+                    .limit(settings.revalidation_batch_size)
+                )
+            ).all()
+        if not rows:
+            return changed
+        last_id = rows[-1].id
+        changed += len(await revalidate_batch(list(rows), limiter))
+
+
+async def run_revalidation_loop() -> None:
+    """Фоновая задача: перепроверка источников раз в revalidation_interval_seconds."""
+    while True:
+        try:
+            changed = await revalidate_all()
+            logger.info("Source revalidation finished, %s items changed", changed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Source revalidation failed")
+        await asyncio.sleep(settings.revalidation_interval_seconds)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import create_access_token, get_password_hash, verify_password
-from app.db import get_db
+from app.cache import invalidate_user_async
+from app.core.security import create_access_token, hash_password_async, verify_password_async
+from app.db import get_async_db
 from app.dependencies import get_current_user
 from app.models import User
 from app.schemas import Token, UserCreate, UserPublic
@@ -13,32 +15,42 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=UserPublic)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == user_in.email).first()
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(User).where(User.email == user_in.email))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists",
         )
-    user = User(email=user_in.email, password_hash=get_password_hash(user_in.password))
+    # bcrypt считается в отдельном пуле, event loop не блокируется
+    user = User(email=user_in.email, password_hash=await hash_password_async(user_in.password))
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    # email мог принадлежать удалённому аккаунту, личность которого ещё в кэше
+    await invalidate_user_async(user.email)
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    ok, new_hash = (
+        await verify_password_async(form_data.password, user.password_hash) if user else (False, None)
+    )
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token({"sub": user.email})
+    if new_hash is not None:
+        # хеш со старой стоимостью bcrypt — заменяем, пока известен пароль
+        user.password_hash = new_hash
+        await db.commit()
+    access_token = create_access_token({"sub": user.email, "uid": user.id})
     return Token(access_token=access_token)
 
 
@@ -1,14 +1,27 @@
-from typing import List, Optional
+import asyncio
+import json
+from typing import Any, AsyncIterator, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
-from app.dependencies import get_current_user
-from app.models import User, Wishlist, WishlistItem
+from app.cache import invalidate_wishlist_async
+from app.core.config import settings
+from app.db import get_async_db
+from app.dependencies import get_current_user_id
+from app.models import Wishlist, WishlistItem
 from app.realtime import manager
 
+try:
+    from app.routers.preview import get_preview
+except ImportError:  # без httpx/bs4 импорт работает, но без автозаполнения
+    get_preview = None
+
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
 
 class ItemBase(BaseModel):
     title: str
@@ -28,6 +41,11 @@ class ItemPublic(ItemBase):
         from_attributes = True
 
 
+class BulkItemIn(ItemBase):
+    # с autofill=true название можно не передавать — возьмётся со страницы товара
+    title: Optional[str] = None
+
+
 router = APIRouter(prefix="/items", tags=["items"])
 
 
@@ -39,13 +57,11 @@ router = APIRouter(prefix="/items", tags=["items"])
 async def create_item(
     wishlist_id: int,
     item_in: ItemBase,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    wishlist = (
-        db.query(Wishlist)
-        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user.id)
-        .first()
+    wishlist = await db.scalar(
+        select(Wishlist).where(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user_id)
     )
     if not wishlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
@@ -62,57 +78,216 @@ async def create_item(
         source_unavailable=item_in.source_unavailable,
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
+    await invalidate_wishlist_async(item.wishlist_id)
 
+    # поля товара клиент перечитывает через REST, в комнату уходит только id
     room = str(item.wishlist_id)
-    await manager.broadcast(room, {"type": "item_created"})
+    await manager.broadcast(room, {"type": "item_created", "item_id": item.id})
     return item
 
 
+def _body_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body is too large, limit is {settings.bulk_import_max_bytes} bytes",
+    )
+
+
+async def _iter_limited_body(request: Request) -> AsyncIterator[bytes]:
+    """Тело запроса по частям, не больше bulk_import_max_bytes.
+
+    Content-Length проверяется до чтения; без него (chunked) — по мере поступления.
+    """
+    limit = settings.bulk_import_max_bytes
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+    if declared > limit:
+        raise _body_too_large()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _body_too_large()
+        yield chunk
+
+
+async def _iter_bulk_rows(request: Request) -> AsyncIterator[Union[bytes, Any]]:
+    """Строки импорта: для NDJSON — сырые строки по мере чтения тела, иначе элементы JSON-массива."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        buffer = b""
+        async for chunk in _iter_limited_body(request):
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    body = b"".join([chunk async for chunk in _iter_limited_body(request)])
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array")
+    for row in rows:
+        yield row
+
+
+def _row_errors(index: int, exc: ValidationError) -> dict:
+    return {
+        "index": index,
+        "errors": [{"loc": list(e["loc"]), "msg": e["msg"], "type": e["type"]} for e in exc.errors()],
+    }
+
+
+async def _autofill(rows: List[BulkItemIn]) -> None:
+    """Дополняет пустые title, image_url и price_cents из превью ссылки."""
+    semaphore = asyncio.Semaphore(settings.bulk_autofill_concurrency)
+
+    async def fill(row: BulkItemIn) -> None:
+        if not row.url or not row.url.startswith(("http://", "https://")):
+            return
+        if row.title and row.image_url and row.price_cents is not None:
+            return
+        async with semaphore:
+            preview = await get_preview(row.url)
+        # длины — по колонкам wishlist_items; обрезанная ссылка на картинку бесполезна
+        if not row.title and preview.get("title"):
+            row.title = preview["title"][:255]
+        if not row.image_url and len(preview.get("image_url") or "") <= 500:
+            row.image_url = preview.get("image_url")
+        if row.price_cents is None:
+            row.price_cents = preview.get("price_cents")
+
+    await asyncio.gather(*(fill(row) for row in rows))
+
+
+@router.post(
+    "/wishlist/{wishlist_id}/bulk",
+    response_model=List[ItemPublic],
+    status_code=status.HTTP_201_CREATED,
+)
+async def bulk_create_items(
+    wishlist_id: int,
+    request: Request,
+    autofill: bool = Query(False, description="Заполнить пустые поля по ссылке на товар"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Массовое добавление товаров: JSON-массив или NDJSON (`application/x-ndjson`).
+
+    Все строки проверяются до записи; при ошибках ничего не сохраняется и
+    возвращается 422 с номерами строк. Запись — пачками в одной транзакции,
+    клиентам уходит одно событие `items_created`.
+    """
+    wishlist = await db.scalar(
+        select(Wishlist).where(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user_id)
+    )
+    if not wishlist:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
+
+    rows: List[BulkItemIn] = []
+    errors: List[dict] = []
+    index = 0
+    async for raw in _iter_bulk_rows(request):
+        if index >= settings.bulk_import_max_items:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Too many items, limit is {settings.bulk_import_max_items}",
+            )
+        try:
+            if isinstance(raw, bytes):
+                rows.append(BulkItemIn.model_validate_json(raw))
+            else:
+                rows.append(BulkItemIn.model_validate(raw))
+        except ValidationError as exc:
+            errors.append(_row_errors(index, exc))
+        index += 1
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+
+    if autofill and get_preview is not None:
+        await _autofill(rows)
+    errors = [
+        {"index": i, "errors": [{"loc": ["title"], "msg": "Field required", "type": "missing"}]}
+        for i, row in enumerate(rows)
+        if not row.title
+    ]
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+    if not rows:
+        return []
+
+    values = [{"wishlist_id": wishlist_id, **row.model_dump()} for row in rows]
+    items: List[WishlistItem] = []
+    batch_size = settings.bulk_insert_batch_size
+    for start in range(0, len(values), batch_size):
+        # executemany с RETURNING: id приходят пачкой, без refresh на каждую строку
+        result = await db.scalars(
+            insert(WishlistItem).returning(WishlistItem, sort_by_parameter_order=True),
+            values[start:start + batch_size],
+        )
+        items.extend(result.all())
+    await db.commit()
+    await invalidate_wishlist_async(wishlist_id)
+
+    created = [ItemPublic.model_validate(item).model_dump() for item in items]
+    await manager.broadcast(
+        str(wishlist_id), {"type": "items_created", "item_ids": [item.id for item in items]}
+    )
+    return created
+
+
 @router.patch("/{item_id}", response_model=ItemPublic)
 async def update_item(
     item_id: int,
     item_in: ItemBase,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    item = (
-        db.query(WishlistItem)
+    item = await db.scalar(
+        select(WishlistItem)
         .join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
-        .filter(WishlistItem.id == item_id, Wishlist.owner_id == current_user.id)
-        .first()
+        .where(WishlistItem.id == item_id, Wishlist.owner_id == current_user_id)
     )
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     for field, value in item_in.model_dump().items():
         setattr(item, field, value)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
+    await invalidate_wishlist_async(item.wishlist_id)
 
     room = str(item.wishlist_id)
-    await manager.broadcast(room, {"type": "item_updated"})
+    await manager.broadcast(room, {"type": "item_updated", "item_id": item.id})
     return item
 
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_item(
     item_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    item = (
-        db.query(WishlistItem)
+    item = await db.scalar(
+        select(WishlistItem)
         .join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
-        .filter(WishlistItem.id == item_id, Wishlist.owner_id == current_user.id)
-        .first()
+        .where(WishlistItem.id == item_id, Wishlist.owner_id == current_user_id)
     )
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     wishlist_id = item.wishlist_id
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
+    await invalidate_wishlist_async(wishlist_id)
     room = str(wishlist_id)
-    await manager.broadcast(room, {"type": "item_deleted"})
+    await manager.broadcast(room, {"type": "item_deleted", "item_id": item_id})
     return
 
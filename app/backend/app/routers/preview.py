@@ -1,15 +1,20 @@
 # Backend: автозаполнение по URL — эндпоинт превью страницы
 # Добавить в requirements.txt: httpx==0.27.0 beautifulsoup4==4.12.3
 
+import asyncio
 import json
 import re
-from typing import Optional
-from urllib.parse import urlparse
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import httpx
 from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from bs4 import BeautifulSoup
 
+from app.cache import MemoryCacheBackend
+from app.core.config import settings
+
 router = APIRouter(prefix="/preview", tags=["preview"])
 
 USER_AGENT = (
@@ -21,6 +26,21 @@ USER_AGENT = (
 IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".svg")
 IMAGE_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/svg+xml")
 
+# lxml заметно быстрее встроенного html.parser на больших страницах; используем, если установлен
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Один долгоживущий клиент на процесс: переиспользует TCP/TLS-соединения между запросами
+_client: Optional[httpx.AsyncClient] = None
+# Результаты по нормализованному URL; неудачные загрузки кэшируются на меньший срок
+_cache = MemoryCacheBackend(max_entries=settings.preview_cache_max_entries)
+# URL -> загрузка в процессе: одновременные запросы одной ссылки ждут одну и ту же задачу
+_inflight: Dict[str, "asyncio.Task[dict]"] = {}
+_stats = {"hits": 0, "misses": 0, "deduplicated": 0}
+
 
 def _is_direct_image_url(url: str) -> bool:
     """Проверяет, похожа ли ссылка на прямой URL картинки."""
@@ -28,97 +48,316 @@ def _is_direct_image_url(url: str) -> bool:
     return lower.endswith(IMAGE_EXTENSIONS)
 
 
+def _empty_result() -> dict:
+    return {"title": None, "image_url": None, "price_cents": None, "currency": None, "availability": None}
+
+
+def _normalize_url(url: str) -> str:
+    """Ключ кэша: схема и хост в нижнем регистре, без фрагмента и utm-меток."""
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if (parsed.scheme == "http" and netloc.endswith(":80")) or (
+        parsed.scheme == "https" and netloc.endswith(":443")
+    ):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = urlencode(
+        [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if not k.startswith("utm_")]
+    )
+    return urlunparse((parsed.scheme.lower(), netloc, parsed.path or "/", parsed.params, query, ""))
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            http2=http2,
+            timeout=15.0,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=settings.preview_max_connections,
+                max_keepalive_connections=settings.preview_max_keepalive,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def preview_stats() -> dict:
+    return {**_stats, "inflight": len(_inflight)}
+
+
 @router.get("")
-def preview_url(url: str = Query(..., min_length=10)):
-    """По ссылке возвращает title, image_url, price_cents. Поддерживает:
+async def preview_url(url: str = Query(..., min_length=10)):
+    """По ссылке возвращает title, image_url, price_cents (и currency, availability, если есть). Поддерживает:
     - Ссылку на страницу товара (извлекает og:image, title, цену)
     - Прямую ссылку на картинку (jpg, png и т.д.) — использует как image_url
     """
     if not url.startswith(("http://", "https://")):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid URL")
-    result = {"title": None, "image_url": None, "price_cents": None}
 
+    return await get_preview(url)
+
+
+async def get_preview(url: str) -> dict:
+    """Превью через кэш и single-flight; используется и при массовом импорте товаров."""
     # Если это прямая ссылка на картинку — сразу возвращаем её как image_url
     if _is_direct_image_url(url):
-        result["image_url"] = url[:2000]
-        return result
+        return {**_empty_result(), "image_url": url[:2000]}
+
+    try:
+        key = _normalize_url(url)
+    except ValueError:
+        # битая ссылка (например, http://[::1/x) — как и при ошибке загрузки, пустое превью
+        return _empty_result()
+    cached = _cache.get(key)
+    if cached is not None:
+        _stats["hits"] += 1
+        return json.loads(cached)
+    _stats["misses"] += 1
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(key, url))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _stats["deduplicated"] += 1
+    # shield: отмена одного клиента не должна обрывать загрузку для остальных
+    return await asyncio.shield(task)
+
+
+async def _load(key: str, url: str) -> dict:
+    result, ok = await _fetch_preview(url)
+    ttl = settings.preview_cache_ttl_seconds if ok else settings.preview_negative_ttl_seconds
+    # кладём в кэш до снятия задачи из _inflight, чтобы не было окна для повторной загрузки
+    _cache.set(key, json.dumps(result).encode(), ttl)
+    return result
+
+
+async def _fetch_preview(url: str) -> tuple[dict, bool]:
+    """Загружает страницу и извлекает превью. Второй элемент — удалась ли загрузка."""
+    result = _empty_result()
+    client = _get_client()
 
     # Проверка по Content-Type (HEAD-запрос) — некоторые CDN не имеют расширения в URL
     try:
-        with httpx.Client(follow_redirects=True, timeout=10.0, headers={"User-Agent": USER_AGENT}) as client:
-            head = client.head(url)
-            ct = head.headers.get("content-type", "").lower().split(";")[0].strip()
-            if any(t in ct for t in IMAGE_CONTENT_TYPES):
-                result["image_url"] = url[:2000]
-                return result
+        head = await client.head(url, timeout=10.0)
+        ct = head.headers.get("content-type", "").lower().split(";")[0].strip()
+        if any(t in ct for t in IMAGE_CONTENT_TYPES):
+            result["image_url"] = url[:2000]
+            return result, True
     except Exception:
         pass
 
     # Иначе считаем, что это страница товара — парсим HTML
     try:
-        with httpx.Client(follow_redirects=True, timeout=15.0, headers={"User-Agent": USER_AGENT}) as client:
-            resp = client.get(url)
+        if settings.preview_streaming:
+            async with client.stream("GET", url, timeout=15.0) as resp:
+                resp.raise_for_status()
+                result.update(await _stream_preview(resp, url))
+        else:
+            resp = await client.get(url, timeout=15.0)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-
-        # Open Graph — заголовок
-        og_title = soup.find("meta", property="og:title")
-        if og_title and og_title.get("content"):
-            result["title"] = og_title["content"].strip()[:500]
-        if not result["title"]:
-            title_tag = soup.find("title")
-            if title_tag and title_tag.string:
-                result["title"] = title_tag.string.strip()[:500]
+            # разбор многомегабайтной страницы — работа для CPU, не для event loop
+            result.update(await run_in_threadpool(_parse_html, resp.text, url))
+    except httpx.HTTPError:
+        return result, False
+    except Exception:
+        return result, False
+    return result, True
 
-        # Картинка: og:image, twitter:image, JSON-LD, link rel
-        result["image_url"] = _extract_image(soup, url)
 
-        # Цена
-        price_cents = _extract_price(soup, resp.text)
-        if price_cents is not None:
-            result["price_cents"] = price_cents
+async def check_source(url: str) -> Optional[dict]:
+    """Статус страницы товара для фоновой перепроверки.
 
-    except httpx.HTTPError:
-        pass
+    Возвращает status_code и извлечённые поля или None, если страница
+    не ответила (сетевая ошибка, таймаут) — тогда о товаре ничего не известно.
+    """
+    try:
+        async with _get_client().stream("GET", url, timeout=15.0) as resp:
+            ct = resp.headers.get("content-type", "").lower()
+            if resp.status_code >= 400 or not ct.startswith("text/html"):
+                return {**_empty_result(), "status_code": resp.status_code}
+            # availability часто лежит в JSON-LD в <body>: без неё по <head> не останавливаемся
+            result = await _stream_preview(resp, url, required=_REVALIDATION_FIELDS)
+            return {**result, "status_code": resp.status_code}
     except Exception:
-        pass
-    return result
+        # сеть, таймаут, битый URL (httpx.InvalidURL, ValueError) — о товаре ничего не известно
+        return None
+
 
+# поля, после которых можно не читать тело страницы
+_PREVIEW_FIELDS = ("title", "image_url", "price_cents")
+_REVALIDATION_FIELDS = _PREVIEW_FIELDS + ("availability",)
 
-def _extract_image(soup: BeautifulSoup, base_url: str) -> Optional[str]:
-    """Извлекает URL картинки из страницы товара."""
+
+async def _stream_preview(
+    resp: httpx.Response, url: str, required: tuple[str, ...] = _PREVIEW_FIELDS
+) -> dict:
+    """Читает страницу порциями и останавливается как можно раньше.
+
+    Если в <head> уже есть все поля из required (og-теги, JSON-LD) — тело
+    не скачивается. Иначе читаем дальше, но не больше preview_max_bytes.
+    """
+    encoding = resp.encoding or "utf-8"
+    buf = bytearray()
+    head_end = -1
+    async for chunk in resp.aiter_bytes():
+        scan_from = max(len(buf) - len(b"</head>"), 0)
+        buf.extend(chunk)
+        if head_end < 0:
+            pos = bytes(buf[scan_from:]).lower().find(b"</head>")
+            if pos >= 0:
+                head_end = scan_from + pos + len(b"</head>")
+                head_html = buf[:head_end].decode(encoding, errors="replace")
+                result = await run_in_threadpool(_parse_html, head_html, url)
+                if all(result[k] is not None for k in required):
+                    return result
+        if len(buf) >= settings.preview_max_bytes:
+            break
+    html = buf[: settings.preview_max_bytes].decode(encoding, errors="replace")
+    return await run_in_threadpool(_parse_html, html, url)
+
+
+def _parse_html(html: str, url: str) -> dict:
+    soup = BeautifulSoup(html, HTML_PARSER)
+    return _extract_candidates(soup, html, url)
+
+
+def _extract_candidates(soup: BeautifulSoup, raw_html: str, base_url: str) -> dict:
+    """Один проход по документу: title, image_url, price_cents, currency, availability.
+
+    Мета-теги, JSON-LD (каждый блок разбирается один раз), <title> и link rel
+    собираются за один обход; дальше кандидаты выбираются в прежнем порядке
+    приоритета. CSS-селекторы и поиск по сырому HTML — только если цены не нашлось.
+    """
+    meta_by_property: dict[str, str] = {}
+    meta_by_name: dict[str, str] = {}
+    price_metas: list[str] = []
+    ld_items: list[dict] = []
+    title_tag = None
+    image_src = None
+
+    for tag in soup.find_all(["meta", "script", "title", "link"]):
+        if tag.name == "meta":
+            content = tag.get("content")
+            prop = tag.get("property")
+            if prop:
+                if content:
+                    meta_by_property.setdefault(prop, content)
+                if _PRICE_META_RE.search(prop):
+                    value = content or tag.get("value")
+                    if value:
+                        price_metas.append(value)
+            name = tag.get("name")
+            if name and content:
+                meta_by_name.setdefault(name, content)
+        elif tag.name == "script":
+            if tag.get("type") == "application/ld+json" and tag.string:
+                try:
+                    data = json.loads(tag.string)
+                except Exception:
+                    continue
+                items = [data] if isinstance(data, dict) else (data if isinstance(data, list) else [])
+                ld_items.extend(item for item in items if isinstance(item, dict))
+        elif tag.name == "title":
+            if title_tag is None:
+                title_tag = tag
+        elif image_src is None and "image_src" in (tag.get("rel") or []) and tag.get("href"):
+            image_src = tag["href"]
+
+    candidates = _empty_result()
+
+    # Open Graph — заголовок
+    if meta_by_property.get("og:title"):
+        candidates["title"] = meta_by_property["og:title"].strip()[:500]
+    if not candidates["title"] and title_tag is not None and title_tag.string:
+        candidates["title"] = title_tag.string.strip()[:500]
+
+    candidates["image_url"] = _pick_image(meta_by_property, meta_by_name, ld_items, image_src, base_url)
+
+    # JSON-LD Product: цена, валюта и наличие из offers
+    for item in ld_items:
+        offers = item.get("offers") or {}
+        if isinstance(offers, list) and offers:
+            offers = offers[0]
+        price = offers.get("price") if isinstance(offers, dict) else item.get("price")
+        if price is None:
+            continue
+        try:
+            candidates["price_cents"] = int(round(float(price) * 100))
+        except (ValueError, TypeError):
+            continue
+        if isinstance(offers, dict):
+            candidates["currency"] = offers.get("priceCurrency")
+            availability = offers.get("availability")
+            if isinstance(availability, str):
+                candidates["availability"] = availability.rsplit("/", 1)[-1]
+        break
+
+    candidates["currency"] = candidates["currency"] or meta_by_property.get(
+        "product:price:currency"
+    ) or meta_by_property.get("og:price:currency")
+    candidates["availability"] = candidates["availability"] or meta_by_property.get(
+        "product:availability"
+    ) or meta_by_property.get("og:availability")
+
+    if candidates["price_cents"] is None:
+        candidates["price_cents"] = _fallback_price(soup, raw_html, price_metas)
+    return candidates
+
+
+_PRICE_META_RE = re.compile(r"product:price|price", re.I)
+
+
+def _absolute_url(value: str, base_url: str) -> str:
+    value = value.strip()
+    if value.startswith("//"):
+        return "https:" + value
+    if value.startswith("/"):
+        parsed = urlparse(base_url)
+        return f"{parsed.scheme}://{parsed.netloc}{value}"
+    return value
+
+
+def _pick_image(
+    meta_by_property: dict[str, str],
+    meta_by_name: dict[str, str],
+    ld_items: list[dict],
+    image_src: Optional[str],
+    base_url: str,
+) -> Optional[str]:
+    """Картинка: og:image, twitter:image, JSON-LD, link rel="image_src"."""
     # Open Graph
     for prop in ("og:image", "og:image:url", "twitter:image"):
-        meta = soup.find("meta", attrs={"property": prop}) or soup.find("meta", attrs={"name": prop})
-        if meta and meta.get("content"):
-            img = meta["content"].strip()
-            if img.startswith("//"):
-                img = "https:" + img
-            elif img.startswith("/"):
-                parsed = urlparse(base_url)
-                img = f"{parsed.scheme}://{parsed.netloc}{img}"
+        content = meta_by_property.get(prop) or meta_by_name.get(prop)
+        if content:
+            img = _absolute_url(content, base_url)
             return img[:2000] if img.startswith("http") else None
 
     # JSON-LD Product image
-    for script in soup.find_all("script", type="application/ld+json"):
-        if not script.string:
-            continue
-        try:
-            data = json.loads(script.string)
-            items = [data] if isinstance(data, dict) else (data if isinstance(data, list) else [])
-            for item in items:
-                img = item.get("image")
-                if img:
-                    url_str = img if isinstance(img, str) else (img.get("url") if isinstance(img, dict) else (img[0] if isinstance(img, list) else None))
-                    if url_str and url_str.startswith("http"):
-                        return url_str[:2000]
-        except Exception:
-            continue
+    for item in ld_items:
+        img = item.get("image")
+        if img:
+            url_str = img if isinstance(img, str) else (img.get("url") if isinstance(img, dict) else (img[0] if isinstance(img, list) else None))
+            if isinstance(url_str, str) and url_str.startswith("http"):
+                return url_str[:2000]
 
     # link rel="image_src"
-    link = soup.find("link", rel="image_src")
-    if link and link.get("href"):
-        href = link["href"].strip()
+    if image_src:
+        href = image_src.strip()
         if href.startswith("//"):
             href = "https:" + href
         if href.startswith("http"):
@@ -127,39 +366,18 @@ def _extract_image(soup: BeautifulSoup, base_url: str) -> Optional[str]:
     return None
 
 
-def _extract_price(soup: BeautifulSoup, raw_html: str) -> Optional[int]:
-    # JSON-LD Product
-    for script in soup.find_all("script", type="application/ld+json"):
-        if not script.string:
-            continue
-        try:
-            data = json.loads(script.string)
-            if isinstance(data, dict):
-                data = [data]
-            for item in data if isinstance(data, list) else [data]:
-                offers = item.get("offers") or {}
-                if isinstance(offers, list) and offers:
-                    offers = offers[0]
-                price = offers.get("price") if isinstance(offers, dict) else item.get("price")
-                if price is not None:
-                    p = float(price)
-                    return int(round(p * 100))
-        except Exception:
-            continue
-
+def _fallback_price(soup: BeautifulSoup, raw_html: str, price_metas: list[str]) -> Optional[int]:
     # Мета-теги и data-атрибуты
-    for meta in soup.find_all("meta", property=re.compile(r"product:price|price", re.I)):
-        content = meta.get("content") or meta.get("value")
-        if content:
-            num = _parse_price_string(content)
-            if num is not None:
-                return num
+    for content in price_metas:
+        num = _parse_price_string(content)
+        if num is not None:
+            return num
 
     # Типичные классы/селекторы
     for sel in ["[itemprop=price]", ".price", "[data-price]", ".product-price", ".ProductPrice"]:
         el = soup.select_one(sel)
         if el:
-            content = el.get("content") or el.get("data-price") or (el.get_text(strip=True) if el else None)
+            content = el.get("content") or el.get("data-price") or el.get_text(strip=True)
             if content:
                 num = _parse_price_string(str(content))
                 if num is not None:
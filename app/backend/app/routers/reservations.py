@@ -2,10 +2,11 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.cache import invalidate_wishlist_async
+from app.db import get_async_db
 from app.models import Contribution, Reservation, WishlistItem
 from app.realtime import manager
 
@@ -29,15 +30,17 @@ router = APIRouter(prefix="/items", tags=["reservations"])
 async def reserve_item(
     item_id: int,
     payload: ReserveCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    item = db.query(WishlistItem).filter(WishlistItem.id == item_id).first()
+    # SELECT ... FOR UPDATE: параллельные резервы одного товара выполняются по очереди,
+    # поэтому проверка «уже зарезервирован» и вставка не разъезжаются
+    item = await db.get(WishlistItem, item_id, with_for_update=True)
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
     # одиночный подарок — запрещаем второй резерв
     if not item.allow_group_funding:
-        existing = db.query(Reservation).filter(Reservation.item_id == item.id).first()
+        existing = await db.scalar(select(Reservation).where(Reservation.item_id == item.id).limit(1))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,11 +54,22 @@ async def reserve_item(
         is_group=payload.is_group,
     )
     db.add(reservation)
-    db.commit()
-    db.refresh(reservation)
+    item.reservation_count += 1
+    await db.commit()
+    await db.refresh(reservation)
+    await invalidate_wishlist_async(item.wishlist_id)
 
+    # в событии только id и счётчики: имена и сообщения клиент берёт из REST
     room = str(item.wishlist_id)
-    await manager.broadcast(room, {"type": "item_reserved"})
+    await manager.broadcast(
+        room,
+        {
+            "type": "item_reserved",
+            "item_id": item.id,
+            "reservation_id": reservation.id,
+            "reservation_count": item.reservation_count,
+        },
+    )
     return {"id": reservation.id}
 
 
@@ -63,9 +77,11 @@ async def reserve_item(
 async def contribute_to_item(
     item_id: int,
     payload: ContributionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    item = db.query(WishlistItem).filter(WishlistItem.id == item_id).first()
+    # блокировка строки товара до commit: проверка остатка, вставка и обновление
+    # счётчиков выполняются атомарно, сбор не может превысить цель
+    item = await db.get(WishlistItem, item_id, with_for_update=True)
     if not item or not item.allow_group_funding:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
@@ -82,13 +98,7 @@ async def contribute_to_item(
             detail="Contribution below minimum amount",
         )
 
-    total_contributed = (
-        db.query(func.coalesce(func.sum(Contribution.amount_cents), 0))
-        .join(Reservation, Reservation.id == Contribution.reservation_id)
-        .filter(Reservation.item_id == item_id)
-        .scalar()
-    )
-    remaining = target - total_contributed
+    remaining = target - item.collected_amount_cents
     if payload.amount_cents > remaining:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -96,10 +106,10 @@ async def contribute_to_item(
         )
 
     # создаём (или переиспользуем) «групповой» резерв
-    reservation = (
-        db.query(Reservation)
-            .filter(Reservation.item_id == item_id, Reservation.is_group == True)  # noqa: E712
-            .first()
+    reservation = await db.scalar(
+        select(Reservation)
+        .where(Reservation.item_id == item_id, Reservation.is_group == True)  # noqa: E712
+        .limit(1)
     )
     if not reservation:
         reservation = Reservation(
@@ -109,7 +119,8 @@ async def contribute_to_item(
             is_group=True,
         )
         db.add(reservation)
-        db.flush()
+        item.reservation_count += 1
+        await db.flush()
 
     contribution = Contribution(
         reservation_id=reservation.id,
@@ -118,10 +129,26 @@ async def contribute_to_item(
         is_anonymous=payload.is_anonymous,
     )
     db.add(contribution)
-    db.commit()
-    db.refresh(contribution)
+    item.collected_amount_cents += payload.amount_cents
+    item.contribution_count += 1
+    await db.commit()
+    await db.refresh(contribution)
+    await invalidate_wishlist_async(item.wishlist_id)
 
+    # как в contributions=aggregate: суммы и счётчики без имён и размеров вкладов
     room = str(item.wishlist_id)
-    await manager.broadcast(room, {"type": "contribution_added"})
+    await manager.broadcast(
+        room,
+        {
+            "type": "contribution_added",
+            "item_id": item.id,
+            # групповой резерв мог быть создан этим же вкладом
+            "reservation_id": reservation.id,
+            "contribution_id": contribution.id,
+            "reservation_count": item.reservation_count,
+            "contribution_count": item.contribution_count,
+            "collected_amount_cents": item.collected_amount_cents,
+        },
+    )
     return {"id": contribution.id}
 
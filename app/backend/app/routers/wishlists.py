@@ -1,36 +1,173 @@
-from typing import List
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, selectinload
 
+from app.cache import invalidate_wishlist, public_cache
 from app.db import get_db
-from app.dependencies import get_current_user
-from app.models import User, Wishlist, WishlistItem, Reservation, Contribution
+from app.dependencies import get_current_user_id
+from app.models import Wishlist, WishlistItem, Reservation
 from app.schemas import WishlistBase, WishlistCreate, WishlistPublic
-from app.utils import generate_slug
+from app.utils import decode_cursor, encode_cursor, generate_slug
 
 
 router = APIRouter(prefix="/wishlists", tags=["wishlists"])
 
 
+def _not_modified(request: Request, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def _not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+# поля, которые можно запросить через ?fields= (те же, что в WishlistPublic)
+WISHLIST_FIELDS = {name: getattr(Wishlist, name) for name in WishlistPublic.model_fields}
+
+
+def _items_page(
+    db: Session,
+    wishlist_id: int,
+    items_limit: Optional[int],
+    items_cursor: Optional[str],
+    *options,
+) -> Tuple[List[WishlistItem], Optional[str]]:
+    """Страница товаров вишлиста в порядке id и курсор следующей (None — товары кончились).
+
+    Без `items_limit` возвращаются все товары, как раньше.
+    """
+    query = db.query(WishlistItem).filter(WishlistItem.wishlist_id == wishlist_id)
+    if options:
+        query = query.options(*options)
+    if items_cursor:
+        try:
+            (last_id,) = decode_cursor(items_cursor)
+            last_id = int(last_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.filter(WishlistItem.id > last_id)
+    query = query.order_by(WishlistItem.id)
+    if items_limit:
+        query = query.limit(items_limit + 1)
+    items = query.all()
+    if items_limit and len(items) > items_limit:
+        items = items[:items_limit]
+        return items, encode_cursor(items[-1].id)
+    return items, None
+
+
+def _public_item(item: WishlistItem, with_contributions: bool) -> dict:
+    """Товар для гостей: статусы, имена резервирующих и (по желанию) вкладчиков."""
+    reservations = []
+    for r in item.reservations:
+        reservation = {
+            "id": r.id,
+            "reserver_name": r.reserver_name,
+            "message": r.message,
+            "is_group": r.is_group,
+            "created_at": r.created_at,
+        }
+        if with_contributions:
+            reservation["contributions"] = [
+                {
+                    "id": c.id,
+                    "amount_cents": c.amount_cents,
+                    "contributor_name": None if c.is_anonymous else c.contributor_name,
+                    "is_anonymous": c.is_anonymous,
+                }
+                for c in r.contributions
+            ]
+        reservations.append(reservation)
+    return {
+        "id": item.id,
+        "title": item.title,
+        "url": item.url,
+        "image_url": item.image_url,
+        "price_cents": item.price_cents,
+        "allow_group_funding": item.allow_group_funding,
+        "target_amount_cents": item.target_amount_cents,
+        "min_contribution_cents": item.min_contribution_cents,
+        "source_unavailable": item.source_unavailable,
+        "reservations": reservations,
+        "collected_amount_cents": item.collected_amount_cents,
+        "contribution_count": item.contribution_count,
+    }
+
+
 @router.get("/me", response_model=List[WishlistPublic])
 def get_my_wishlists(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Список полей через запятую, например id,title"),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    wishlists = (
-        db.query(Wishlist)
-        .filter(Wishlist.owner_id == current_user.id)
-        .order_by(Wishlist.created_at.desc())
-        .all()
+    """Вишлисты владельца, новые первыми.
+
+    С `limit` отдаётся страница; курсор следующей — в заголовке `X-Next-Cursor`.
+    Выбираются только нужные колонки, ORM-объекты не создаются.
+    """
+    etag = public_cache.etag("me", current_user_id, public_cache.owner_version(current_user_id))
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(WISHLIST_FIELDS)
+    unknown = [name for name in names if name not in WISHLIST_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+
+    query = (
+        select(
+            *(WISHLIST_FIELDS[name] for name in names),
+            Wishlist.created_at.label("_cursor_created_at"),
+            Wishlist.id.label("_cursor_id"),
+        )
+        .where(Wishlist.owner_id == current_user_id)
+        .order_by(Wishlist.created_at.desc(), Wishlist.id.desc())
     )
-    return wishlists
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+            created_at = datetime.fromisoformat(created_at)
+            last_id = int(last_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.where(tuple_(Wishlist.created_at, Wishlist.id) < tuple_(created_at, last_id))
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = db.execute(query).all()
+    headers = {"ETag": etag}
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last._cursor_created_at.isoformat(), last._cursor_id)
+    content = [{name: row._mapping[name] for name in names} for row in rows]
+    return JSONResponse(jsonable_encoder(content), headers=headers)
 
 
 @router.post("", response_model=WishlistPublic, status_code=status.HTTP_201_CREATED)
 def create_wishlist(
     wishlist_in: WishlistCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     # генерируем уникальный slug
     slug = generate_slug()
@@ -38,7 +175,7 @@ def create_wishlist(
         slug = generate_slug()
 
     wishlist = Wishlist(
-        owner_id=current_user.id,
+        owner_id=current_user_id,
         title=wishlist_in.title,
         description=wishlist_in.description,
         event_date=wishlist_in.event_date,
@@ -48,37 +185,43 @@ def create_wishlist(
     db.add(wishlist)
     db.commit()
     db.refresh(wishlist)
+    public_cache.bump_owner(current_user_id)
     return wishlist
 
 
 @router.get("/{wishlist_id}")
 def get_wishlist_detail(
     wishlist_id: int,
+    request: Request,
+    response: Response,
+    items_limit: Optional[int] = Query(None, ge=1, le=500),
+    items_cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
+    """Вишлист владельца с агрегатами по товарам.
+
+    С `items_limit` товары отдаются страницами; курсор следующей — в `next_items_cursor`.
+    """
     wishlist = (
         db.query(Wishlist)
-        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user.id)
+        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user_id)
         .first()
     )
     if not wishlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
 
-    # агрегаты для владельца без раскрытия имён и конкретных сумм
+    # 304 отдаём до загрузки товаров, резервов и вкладов
+    etag = public_cache.etag("detail", wishlist.id, public_cache.version(wishlist.id))
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+    response.headers["ETag"] = etag
+
+    # агрегаты для владельца без раскрытия имён и конкретных сумм —
+    # денормализованные счётчики товара, без обращения к резервам и вкладам
+    items, next_items_cursor = _items_page(db, wishlist.id, items_limit, items_cursor)
     items_data = []
-    for item in wishlist.items:
-        total_reserved = len(item.reservations)
-        total_contributed = (
-            db.query(Contribution)
-            .join(Reservation, Reservation.id == Contribution.reservation_id)
-            .filter(Reservation.item_id == item.id)
-            .with_entities(
-                (Contribution.amount_cents).label("amount"),
-            )
-            .all()
-        )
-        collected = sum(row.amount for row in total_contributed)
+    for item in items:
         items_data.append(
             {
                 "id": item.id,
@@ -90,8 +233,8 @@ def get_wishlist_detail(
                 "target_amount_cents": item.target_amount_cents,
                 "min_contribution_cents": item.min_contribution_cents,
                 "source_unavailable": item.source_unavailable,
-                "reserved_count": total_reserved,
-                "collected_amount_cents": collected,
+                "reserved_count": item.reservation_count,
+                "collected_amount_cents": item.collected_amount_cents,
             }
         )
 
@@ -104,6 +247,7 @@ def get_wishlist_detail(
         "is_public": wishlist.is_public,
         "created_at": wishlist.created_at,
         "items": items_data,
+        "next_items_cursor": next_items_cursor,
     }
 
 
@@ -112,11 +256,11 @@ def update_wishlist(
     wishlist_id: int,
     wishlist_in: WishlistBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     wishlist = (
         db.query(Wishlist)
-        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user.id)
+        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user_id)
         .first()
     )
     if not wishlist:
@@ -126,6 +270,8 @@ def update_wishlist(
     wishlist.event_date = wishlist_in.event_date
     db.commit()
     db.refresh(wishlist)
+    invalidate_wishlist(wishlist.id)
+    public_cache.bump_owner(current_user_id)
     return wishlist
 
 
@@ -133,22 +279,47 @@ def update_wishlist(
 def delete_wishlist(
     wishlist_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     wishlist = (
         db.query(Wishlist)
-        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user.id)
+        .filter(Wishlist.id == wishlist_id, Wishlist.owner_id == current_user_id)
         .first()
     )
     if not wishlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
     db.delete(wishlist)
     db.commit()
+    invalidate_wishlist(wishlist_id)
+    public_cache.bump_owner(current_user_id)
     return
 
 
 @router.get("/public/{slug}")
-def get_public_wishlist(slug: str, db: Session = Depends(get_db)):
+def get_public_wishlist(
+    slug: str,
+    request: Request,
+    items_limit: Optional[int] = Query(None, ge=1, le=500),
+    items_cursor: Optional[str] = None,
+    contributions: str = Query("full", pattern="^(full|aggregate)$"),
+    db: Session = Depends(get_db),
+):
+    """Публичный вишлист.
+
+    `items_limit`/`items_cursor` — постраничная выдача товаров.
+    `contributions=aggregate` — без списка вкладов: у товара только
+    `collected_amount_cents` и `contribution_count`, подробности —
+    через `/public/{slug}/items/{item_id}`.
+    """
+    cache_key = f"public:{slug}:{contributions}:{items_limit or ''}:{items_cursor or ''}"
+    cached = public_cache.get(cache_key)
+    if cached is not None:
+        cached_id, cached_version, body = cached
+        etag = public_cache.etag("public", cached_id, cached_version)
+        if _not_modified(request, etag):
+            return _not_modified_response(etag)
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
     wishlist = (
         db.query(Wishlist)
         .filter(Wishlist.public_slug == slug, Wishlist.is_public == True)  # noqa: E712
@@ -156,51 +327,22 @@ def get_public_wishlist(slug: str, db: Session = Depends(get_db)):
     )
     if not wishlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
+    # версию читаем до загрузки товаров: если запись придёт между ними,
+    # кэш получит уже устаревшую версию и не отдаст старый ответ
+    version = public_cache.version(wishlist.id)
+    etag = public_cache.etag("public", wishlist.id, version)
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
 
-    # публичный ответ: гости видят статусы, имена резервирующих и вкладчиков
-    items_data = []
-    for item in wishlist.items:
-        reservations = []
-        total_contributed = 0
-        for r in item.reservations:
-            contribs = []
-            for c in r.contributions:
-                total_contributed += c.amount_cents
-                contribs.append(
-                    {
-                        "id": c.id,
-                        "amount_cents": c.amount_cents,
-                        "contributor_name": None if c.is_anonymous else c.contributor_name,
-                        "is_anonymous": c.is_anonymous,
-                    }
-                )
-            reservations.append(
-                {
-                    "id": r.id,
-                    "reserver_name": r.reserver_name,
-                    "message": r.message,
-                    "is_group": r.is_group,
-                    "created_at": r.created_at,
-                    "contributions": contribs,
-                }
-            )
-        items_data.append(
-            {
-                "id": item.id,
-                "title": item.title,
-                "url": item.url,
-                "image_url": item.image_url,
-                "price_cents": item.price_cents,
-                "allow_group_funding": item.allow_group_funding,
-                "target_amount_cents": item.target_amount_cents,
-                "min_contribution_cents": item.min_contribution_cents,
-                "source_unavailable": item.source_unavailable,
-                "reservations": reservations,
-                "collected_amount_cents": total_contributed,
-            }
-        )
+    # подгружаем дерево фиксированным числом запросов (по одному на уровень),
+    # а не 1 + N + N·M ленивыми обращениями к relationship
+    with_contributions = contributions == "full"
+    loader = selectinload(WishlistItem.reservations)
+    if with_contributions:
+        loader = loader.selectinload(Reservation.contributions)
+    items, next_items_cursor = _items_page(db, wishlist.id, items_limit, items_cursor, loader)
 
-    return {
+    payload = {
         "id": wishlist.id,
         "title": wishlist.title,
         "description": wishlist.description,
@@ -208,6 +350,34 @@ def get_public_wishlist(slug: str, db: Session = Depends(get_db)):
         "public_slug": wishlist.public_slug,
         "is_public": wishlist.is_public,
         "created_at": wishlist.created_at,
-        "items": items_data,
+        "items": [_public_item(item, with_contributions) for item in items],
+        "next_items_cursor": next_items_cursor,
     }
+    body = json.dumps(jsonable_encoder(payload)).encode()
+    public_cache.set(cache_key, wishlist.id, version, body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
+
+@router.get("/public/{slug}/items/{item_id}")
+def get_public_item(slug: str, item_id: int, request: Request, db: Session = Depends(get_db)):
+    """Один товар публичного вишлиста со всеми резервами и вкладами."""
+    wishlist_id = (
+        db.query(Wishlist.id)
+        .filter(Wishlist.public_slug == slug, Wishlist.is_public == True)  # noqa: E712
+        .scalar()
+    )
+    if wishlist_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
+    etag = public_cache.etag(f"public-item-{item_id}", wishlist_id, public_cache.version(wishlist_id))
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+
+    item = (
+        db.query(WishlistItem)
+        .options(selectinload(WishlistItem.reservations).selectinload(Reservation.contributions))
+        .filter(WishlistItem.id == item_id, WishlistItem.wishlist_id == wishlist_id)
+        .first()
+    )
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    return JSONResponse(jsonable_encoder(_public_item(item, True)), headers={"ETag": etag})
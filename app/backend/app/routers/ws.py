@@ -1,19 +1,61 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Optional
 
-from app.realtime import manager
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from app.db import AsyncSessionLocal
+from app.dependencies import get_current_user_id
+from app.models import Wishlist
+from app.realtime import manager, negotiate_subprotocol
 
 
 router = APIRouter()
 
 
+async def _can_join(wishlist_id: int, token: Optional[str]) -> bool:
+    """Комнату слушают все только у публичного вишлиста, у закрытого — лишь владелец."""
+    async with AsyncSessionLocal() as db:
+        row = (
+            await db.execute(select(Wishlist.owner_id, Wishlist.is_public).where(Wishlist.id == wishlist_id))
+        ).first()
+    if row is None:
+        return False
+    if row.is_public:
+        return True
+    if not token:
+        return False
+    try:
+        # старые токены без uid идут в БД синхронной сессией — не в event loop
+        user_id = await run_in_threadpool(get_current_user_id, token)
+    except HTTPException:
+        return False
+    return user_id == row.owner_id
+
+
 async def _wishlist_ws_handler(websocket: WebSocket, wishlist_id: int) -> None:
+    # браузерный WebSocket не передаёт заголовки, токен владельца приходит в ?token=
+    if not await _can_join(wishlist_id, websocket.query_params.get("token")):
+        # закрытие до accept — отказ в рукопожатии (HTTP 403)
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     room = str(wishlist_id)
-    await manager.connect(room, websocket)
+    # Sec-WebSocket-Protocol: "msgpack" — бинарные кадры, "json" или без подпротокола — текст
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    connection = await manager.connect(room, websocket, subprotocol)
+    if connection is None:
+        return
     try:
         while True:
-            await websocket.receive_text()
+            # любое входящее сообщение (обычно ответ {"type": "pong"}) продлевает жизнь сокета
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            connection.touch()
     except WebSocketDisconnect:
-        manager.disconnect(room, websocket)
+        pass
+    finally:
+        manager.disconnect_all(websocket)
 
 
 @router.websocket("/ws/wishlists/{wishlist_id}")
@@ -30,6 +30,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     sub: str
+    uid: Optional[int] = None  # нет в токенах, выданных до появления claim
 
 
 # Wishlists / items (частично, для дальнейших шагов)
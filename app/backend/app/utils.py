@@ -1,8 +1,28 @@
+import base64
+import json
 import random
 import string
+from typing import Any
 
 
 def generate_slug(length: int = 8) -> str:
     alphabet = string.ascii_lowercase + string.digits
     return "".join(random.choice(alphabet) for _ in range(length))
 
+
+def encode_cursor(*values: Any) -> str:
+    """Непрозрачный курсор для keyset-пагинации."""
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """Обратное к encode_cursor; ValueError, если курсор повреждён."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
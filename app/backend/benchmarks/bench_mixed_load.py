@@ -0,0 +1,182 @@
+"""p50/p99 под смешанной нагрузкой: HTTP-запросы и WebSocket-подписчики одного вишлиста.
+
+Скрипт нагружает уже запущенный сервер, поэтому «до/после» — это два
+запуска против двух версий. Например, до и после перевода обработчиков
+записи на AsyncSession:
+
+    git worktree add /tmp/before 9343985~1
+    (cd /tmp/before/app/backend && uvicorn app.main:app --port 8001)
+    (cd app/backend && uvicorn app.main:app --port 8002)
+    python -m benchmarks.bench_mixed_load --url http://127.0.0.1:8001
+    python -m benchmarks.bench_mixed_load --url http://127.0.0.1:8002
+
+У каждой версии — своя отдельная база со своей схемой (alembic upgrade head
+в её каталоге). Для каждого запуска создаётся новый пользователь и вишлист.
+
+Нагрузка: --workers параллельных HTTP-клиентов по кругу читают публичный
+вишлист и делают вклады, резервы и правки товаров; --sockets подписчиков
+слушают комнату. Время события WebSocket — от отправки вклада до
+получения contribution_added подписчиком (по contribution_id из ответа).
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+import websockets
+
+
+def _percentiles(values: list[float]) -> str:
+    if len(values) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    median = statistics.median(values)
+    return f"{len(values):>7}  p50 {median:8.1f} ms  p99 {cuts[98]:8.1f} ms  max {max(values):8.1f} ms"
+
+
+async def _setup(client: httpx.AsyncClient, items: int) -> tuple[dict, dict, list[int]]:
+    email = f"bench-{uuid.uuid4().hex}@example.com"
+    (await client.post("/auth/register", json={"email": email, "password": "benchmark"})).raise_for_status()
+    token = (await client.post("/auth/login", data={"username": email, "password": "benchmark"})).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    response = await client.post("/wishlists", json={"title": "Mixed load"}, headers=headers)
+    response.raise_for_status()
+    wishlist = response.json()
+    item_ids = []
+    for i in range(items):
+        response = await client.post(
+            f"/items/wishlist/{wishlist['id']}",
+            json={
+                "title": f"Item {i}",
+                "price_cents": 10_000_000,
+                "allow_group_funding": True,
+            },
+            headers=headers,
+        )
+        response.raise_for_status()
+        item_ids.append(response.json()["id"])
+    return wishlist, headers, item_ids
+
+
+def _events(message: dict) -> list[dict]:
+    return message.get("events", []) if message.get("type") == "batch" else [message]
+
+
+async def _subscriber(url: str, ready: asyncio.Event, stop: asyncio.Event, received: list[dict[int, float]]) -> None:
+    # событие может прийти раньше ответа на POST, поэтому время сопоставляется после прогона
+    arrivals: dict[int, float] = {}
+    received.append(arrivals)
+    async with websockets.connect(url, max_queue=None) as ws:
+        ready.set()
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            now = time.perf_counter()
+            for event in _events(json.loads(raw)):
+                if event.get("type") == "contribution_added":
+                    arrivals[event["contribution_id"]] = now
+
+
+async def _http_worker(
+    client: httpx.AsyncClient,
+    n: int,
+    wishlist: dict,
+    headers: dict,
+    item_ids: list[int],
+    deadline: float,
+    latencies: dict[str, list[float]],
+    errors: dict[str, int],
+    sent: dict[int, float],
+) -> None:
+    step = n
+    while time.monotonic() < deadline:
+        item_id = item_ids[step % len(item_ids)]
+        kind = ("public", "contribute", "public", "reserve", "update_item")[step % 5]
+        step += 1
+        if kind == "public":
+            request = client.get(f"/wishlists/public/{wishlist['public_slug']}")
+        elif kind == "contribute":
+            request = client.post(
+                f"/items/{item_id}/contributions",
+                json={"contributor_name": "Bench", "amount_cents": 100},
+            )
+        elif kind == "reserve":
+            request = client.post(f"/items/{item_id}/reserve", json={"reserver_name": "Bench"})
+        else:
+            request = client.patch(
+                f"/items/{item_id}",
+                json={"title": f"Item {step}", "price_cents": 10_000_000, "allow_group_funding": True},
+                headers=headers,
+            )
+        started = time.perf_counter()
+        response = await request
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors[kind] += 1
+        elif kind == "contribute":
+            sent[response.json()["id"]] = started
+
+
+async def run(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        wishlist, headers, item_ids = await _setup(client, args.items)
+
+        ws_url = args.url.replace("http", "ws", 1) + f"/ws/wishlists/{wishlist['id']}"
+        stop = asyncio.Event()
+        received: list[dict[int, float]] = []
+        ready = [asyncio.Event() for _ in range(args.sockets)]
+        subscribers = [asyncio.create_task(_subscriber(ws_url, r, stop, received)) for r in ready]
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in ready)), timeout=60)
+
+        latencies: dict[str, list[float]] = defaultdict(list)
+        errors: dict[str, int] = defaultdict(int)
+        sent: dict[int, float] = {}
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *(
+                _http_worker(client, n, wishlist, headers, item_ids, deadline, latencies, errors, sent)
+                for n in range(args.workers)
+            )
+        )
+        # дать последним событиям дойти
+        await asyncio.sleep(1)
+        stop.set()
+        await asyncio.gather(*subscribers, return_exceptions=True)
+
+    ws_latencies = [
+        (arrivals[contribution_id] - started) * 1000
+        for arrivals in received
+        for contribution_id, started in sent.items()
+        if contribution_id in arrivals
+    ]
+
+    print(f"{args.url}: workers={args.workers} sockets={args.sockets} duration={args.duration}s")
+    every = [value for values in latencies.values() for value in values]
+    for kind in sorted(latencies):
+        suffix = f"  errors {errors[kind]}" if errors[kind] else ""
+        print(f"http {kind:<12}{_percentiles(latencies[kind])}{suffix}")
+    print(f"http {'all':<12}{_percentiles(every)}")
+    print(f"ws   {'event':<12}{_percentiles(ws_latencies)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Микробенчмарк извлечения превью: старый многопроходный код против _extract_candidates.
+
+Запуск из app/backend:
+
+    python -m benchmarks.bench_preview_extract [--repeat 20] [--parser lxml]
+
+Берёт фикстуры из tests/fixtures/preview и одну «тяжёлую» страницу —
+product_page.html с телом, раздутым до ~1 МБ типовой разметки каталога.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from app.routers import preview
+from tests import legacy_preview
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "preview"
+PAGE_URL = "https://shop.example/p/1"
+FILLER = '<div class="card"><a href="/p/{0}"><img src="/i/{0}.jpg"></a><span>Товар {0}</span></div>\n'
+
+
+def _pages() -> dict[str, str]:
+    pages = {p.stem: p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("*.html"))}
+    base = pages["product_page"]
+    filler = "".join(FILLER.format(i) for i in range(12_000))
+    pages["product_page_1mb"] = base.replace("</body>", filler + "</body>")
+    return pages
+
+
+def _best(fn, html: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(html, PAGE_URL)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--parser", default=preview.HTML_PARSER)
+    args = parser.parse_args()
+
+    preview.HTML_PARSER = legacy_preview.HTML_PARSER = args.parser
+    print(f"parser={args.parser} repeat={args.repeat} (лучшее время, мс)")
+    print(f"{'page':<32}{'size KB':>9}{'old':>10}{'new':>10}{'x':>7}")
+    for name, html in _pages().items():
+        old = _best(legacy_preview._parse_html, html, args.repeat)
+        new = _best(preview._parse_html, html, args.repeat)
+        size = len(html.encode("utf-8")) / 1024
+        print(f"{name:<32}{size:>9.1f}{old:>10.3f}{new:>10.3f}{old / new:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Превью по ссылке: потоковое чтение против полной загрузки — время и пиковый RSS.
+
+Запуск из app/backend:
+
+    python -m benchmarks.bench_preview_stream [--repeat 5] [--padding-mb 4]
+
+Страницы — фикстуры из tests/fixtures/preview и две «тяжёлые» версии
+(тело раздуто до --padding-mb МБ разметки каталога): с полным <head> и
+без мета-тегов, где цена только в теле. Их отдаёт локальный HTTP-сервер.
+Каждая пара (режим, страница) считается в отдельном процессе: ru_maxrss —
+пик за всю жизнь процесса.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "preview"
+FILLER = '<div class="card"><a href="/p/{0}"><img src="/i/{0}.jpg"></a><span>Товар {0}</span></div>\n'
+
+
+def _pages(padding_mb: int) -> dict[str, bytes]:
+    pages = {p.stem: p.read_bytes() for p in sorted(FIXTURES.glob("*.html"))}
+    filler = b""
+    i = 0
+    while len(filler) < padding_mb * 1024 * 1024:
+        filler += "".join(FILLER.format(n) for n in range(i, i + 1000)).encode()
+        i += 1000
+    pages["product_page_big"] = pages["product_page"].replace(b"<body>", b"<body>" + filler)
+    # цены в <head> нет — потоковое чтение идёт дальше и останавливается на preview_max_bytes
+    pages["marketplace_no_meta_big"] = pages["marketplace_no_meta"].replace(b"</body>", filler + b"</body>")
+    return pages
+
+
+def _serve(pages: dict[str, bytes]) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, with_body: bool) -> None:
+            body = pages.get(self.path.strip("/"))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if with_body:
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # потоковый клиент закрыл соединение, дочитав <head>
+                    pass
+
+        def do_HEAD(self):
+            self._respond(with_body=False)
+
+        def do_GET(self):
+            self._respond(with_body=True)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _worker(url: str, repeat: int) -> None:
+    """Дочерний процесс: режим задан через PREVIEW_STREAMING до импорта app."""
+    from app.routers import preview
+
+    async def fetch_all() -> list[float]:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result, ok = await preview._fetch_preview(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert ok, url
+        await preview.close_client()
+        return timings
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = asyncio.run(fetch_all())
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux — в КБ
+    print(json.dumps({"best_ms": min(timings), "rss_growth_kb": peak - before, "peak_rss_kb": peak}))
+
+
+def _run_worker(url: str, streaming: bool, repeat: int) -> dict:
+    env = {**os.environ, "PREVIEW_STREAMING": "true" if streaming else "false"}
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_preview_stream", "--worker", url, "--repeat", str(repeat)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--padding-mb", type=int, default=4)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.repeat)
+        return
+
+    pages = _pages(args.padding_mb)
+    server = _serve(pages)
+    base = f"http://127.0.0.1:{server.server_port}"
+    print(f"repeat={args.repeat}; время — лучшее из повторов, RSS — прирост пика за загрузки")
+    print(f"{'page':<28}{'KB':>8}{'full ms':>10}{'stream ms':>11}{'full +RSS MB':>14}{'stream +RSS MB':>16}")
+    try:
+        for name, body in pages.items():
+            full = _run_worker(f"{base}/{name}", False, args.repeat)
+            stream = _run_worker(f"{base}/{name}", True, args.repeat)
+            print(
+                f"{name:<28}{len(body) / 1024:>8.1f}{full['best_ms']:>10.1f}{stream['best_ms']:>11.1f}"
+                f"{full['rss_growth_kb'] / 1024:>14.1f}{stream['rss_growth_kb'] / 1024:>16.1f}"
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
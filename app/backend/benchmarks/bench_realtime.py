@@ -0,0 +1,292 @@
+"""Нагрузочные замеры ConnectionManager на поддельных сокетах (без сети).
+
+Запуск из app/backend:
+
+    python -m benchmarks.bench_realtime fanout [--sockets 5000] [--slow 50] [--messages 200]
+    python -m benchmarks.bench_realtime serialize [--sockets 1000] [--items 50]
+    python -m benchmarks.bench_realtime churn [--sockets 10000] [--rooms 1]
+
+fanout — рассылка в комнату из --sockets сокетов, из которых --slow отвечают
+с задержкой --slow-delay (мобильный клиент). Для сравнения несколько сообщений
+отправляются «как раньше»: send_json каждому сокету по очереди.
+
+serialize — стоимость одного сообщения: кодирование (json, orjson, msgpack,
+размер после deflate) и полная рассылка на --sockets сокетов по сравнению
+с прежним send_json на каждый сокет.
+
+churn — массовое подключение и отключение (деплой, сбой сети) --sockets
+сокетов; для сравнения — прежний реестр, где комната была списком и каждое
+отключение пересобирало его.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import zlib
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app.realtime import (
+    MSGPACK_SUBPROTOCOL,
+    ConnectionManager,
+    _build_serializer,
+    _dumps_json,
+    _loads,
+    msgpack,
+    orjson,
+)
+
+
+class FakeSocket:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send_text("")
+
+    async def send_json(self, message: dict) -> None:
+        await self.send_text(json.dumps(message, default=str))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def _sockets(count: int, slow: int, slow_delay: float) -> list[FakeSocket]:
+    return [FakeSocket(slow_delay if i < slow else 0.0) for i in range(count)]
+
+
+def _message(n: int) -> dict:
+    return {"type": "item_reserved", "item_id": n, "reservation_id": n, "reservation_count": 1}
+
+
+async def _wait_delivered(sockets: list[FakeSocket], count: int, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while any(socket.received < count for socket in sockets) and time.monotonic() < deadline:
+        await asyncio.sleep(0.001)
+
+
+def _report(name: str, timings: list[float], frames: int, elapsed: float, extra: str = "") -> None:
+    p99 = statistics.quantiles(timings, n=100)[-1] if len(timings) > 1 else timings[0]
+    print(
+        f"{name:<18}broadcast p50 {statistics.median(timings):9.3f} ms  p99 {p99:9.3f} ms  "
+        f"{frames / elapsed:>10,.0f} frames/s  {extra}"
+    )
+
+
+async def fanout(args: argparse.Namespace) -> None:
+    print(f"sockets={args.sockets} slow={args.slow} slow_delay={args.slow_delay}s")
+
+    # прежняя схема: await send_json по очереди, медленный сокет задерживает всех за ним
+    sockets = _sockets(args.sockets, args.slow, args.slow_delay)
+    timings = []
+    started = time.perf_counter()
+    for n in range(args.sequential_messages):
+        t0 = time.perf_counter()
+        for socket in sockets:
+            await socket.send_json(_message(n))
+        timings.append((time.perf_counter() - t0) * 1000)
+    _report(
+        f"sequential x{args.sequential_messages}",
+        timings,
+        args.sockets * args.sequential_messages,
+        time.perf_counter() - started,
+    )
+
+    for policy in ("drop", "disconnect"):
+        manager = ConnectionManager(queue_size=args.queue_size, slow_consumer_policy=policy)
+        sockets = _sockets(args.sockets, args.slow, args.slow_delay)
+        for socket in sockets:
+            await manager.connect("1", socket)
+        timings = []
+        started = time.perf_counter()
+        for n in range(args.messages):
+            t0 = time.perf_counter()
+            await manager.broadcast("1", _message(n))
+            timings.append((time.perf_counter() - t0) * 1000)
+            # даём писателям поработать, как между HTTP-запросами в живом процессе
+            await asyncio.sleep(0)
+        # медленных не ждём: их очереди переполняются, сообщения сбрасываются или сокет закрывается
+        await _wait_delivered(sockets[args.slow:], args.messages)
+        elapsed = time.perf_counter() - started
+        stats = manager.stats()
+        _report(
+            f"{policy} x{args.messages}",
+            timings,
+            sum(socket.received for socket in sockets),
+            elapsed,
+            f"dropped={stats['dropped_messages']} disconnected={stats['slow_disconnects']}",
+        )
+        for socket in sockets:
+            manager.disconnect_all(socket)
+        await manager.close()
+
+
+def _delta(items: int) -> dict:
+    """Крупное сообщение: пачка товаров с датами и вложенными резервами."""
+    created = datetime.now(timezone.utc)
+    return {
+        "type": "items_created",
+        "items": [
+            {
+                "id": i,
+                "title": f"Товар {i} с довольно длинным названием",
+                "url": f"https://shop.example/p/{i}",
+                "image_url": f"https://cdn.shop.example/img/{i}.jpg",
+                "price_cents": 129_900 + i,
+                "allow_group_funding": i % 2 == 0,
+                "target_amount_cents": None,
+                "reservations": [{"id": i, "reserver_name": "Гость", "created_at": created}],
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def _per_call_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+def _deflate(data) -> bytes:
+    # permessage-deflate: raw deflate без заголовка zlib
+    compressor = zlib.compressobj(wbits=-15)
+    raw = data.encode() if isinstance(data, str) else data
+    return compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+async def serialize(args: argparse.Namespace) -> None:
+    message = _delta(args.items)
+    print(f"sockets={args.sockets} items={args.items} messages={args.messages}")
+
+    text = _dumps_json(message)
+    encoders = {"json": _dumps_json}
+    if orjson is not None:
+        encoders["orjson"] = _build_serializer("orjson")
+    print(f"{'encoder':<10}{'us/message':>12}{'bytes':>9}{'deflate':>9}")
+    for name, encode in encoders.items():
+        encoded = encode(message)
+        us = _per_call_us(lambda: encode(message), 200)
+        print(f"{name:<10}{us:>12.1f}{len(encoded.encode()):>9}{len(_deflate(encoded)):>9}")
+    if msgpack is not None:
+        packed = msgpack.packb(_loads(text))
+        us = _per_call_us(lambda: msgpack.packb(_loads(text)), 200)
+        print(f"{'msgpack':<10}{us:>12.1f}{len(packed):>9}{len(_deflate(packed)):>9}")
+
+    print(f"\nрассылка на {args.sockets} сокетов, мс на сообщение:")
+    # прежний путь: jsonable_encoder + json.dumps внутри send_json для каждого сокета
+    sockets = _sockets(args.sockets, 0, 0.0)
+    started = time.perf_counter()
+    for _ in range(args.sequential_messages):
+        for socket in sockets:
+            await socket.send_json(jsonable_encoder(message))
+    per_message = (time.perf_counter() - started) / args.sequential_messages * 1000
+    print(f"{'send_json per socket':<28}{per_message:>8.2f}")
+
+    variants = [(name, 0.0) for name in encoders]
+    if msgpack is not None:
+        variants.append(("orjson" if orjson is not None else "json", args.binary_share))
+    for name, binary_share in variants:
+        manager = ConnectionManager(queue_size=args.messages + 1, serializer=encoders[name])
+        sockets = _sockets(args.sockets, 0, 0.0)
+        binary = int(args.sockets * binary_share)
+        for i, socket in enumerate(sockets):
+            await manager.connect("1", socket, subprotocol=MSGPACK_SUBPROTOCOL if i < binary else None)
+        started = time.perf_counter()
+        for _ in range(args.messages):
+            await manager.broadcast("1", message)
+        await _wait_delivered(sockets, args.messages)
+        label = f"{name}" + (f" + {binary_share:.0%} msgpack" if binary else "")
+        print(f"{label:<28}{(time.perf_counter() - started) / args.messages * 1000:>8.2f}")
+        for socket in sockets:
+            manager.disconnect_all(socket)
+        await manager.close()
+
+
+def _old_disconnect(rooms: dict, room: str, websocket) -> None:
+    # прежний ConnectionManager.disconnect: O(n) на каждый сокет комнаты
+    rooms[room] = [ws for ws in rooms.get(room, []) if ws is not websocket]
+    if not rooms[room]:
+        del rooms[room]
+
+
+async def churn(args: argparse.Namespace) -> None:
+    print(f"sockets={args.sockets} rooms={args.rooms}")
+    print(f"{'registry':<14}{'connect ms':>12}{'disconnect ms':>15}{'tasks left':>12}")
+
+    sockets = _sockets(args.sockets, 0, 0.0)
+    rooms: dict = {}
+    started = time.perf_counter()
+    for i, socket in enumerate(sockets):
+        rooms.setdefault(str(i % args.rooms), []).append(socket)
+    connected = time.perf_counter()
+    for i, socket in enumerate(sockets):
+        _old_disconnect(rooms, str(i % args.rooms), socket)
+    finished = time.perf_counter()
+    print(f"{'list (old)':<14}{(connected - started) * 1000:>12.1f}{(finished - connected) * 1000:>15.1f}{'-':>12}")
+
+    manager = ConnectionManager()
+    baseline_tasks = len(asyncio.all_tasks())
+    started = time.perf_counter()
+    for i, socket in enumerate(sockets):
+        await manager.connect(str(i % args.rooms), socket)
+    connected = time.perf_counter()
+    for socket in sockets:
+        manager.disconnect_all(socket)
+    finished = time.perf_counter()
+    # отменённые писатели и _release комнат завершаются на следующих итерациях loop'а
+    for _ in range(3):
+        await asyncio.sleep(0)
+    tasks_left = len(asyncio.all_tasks()) - baseline_tasks
+    print(
+        f"{'dict + index':<14}{(connected - started) * 1000:>12.1f}"
+        f"{(finished - connected) * 1000:>15.1f}{tasks_left:>12}"
+    )
+    assert manager.stats()["connections"] == 0 and not manager.active_connections
+    await manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fanout_parser = commands.add_parser("fanout", help="рассылка в одну большую комнату")
+    fanout_parser.add_argument("--sockets", type=int, default=5000)
+    fanout_parser.add_argument("--slow", type=int, default=50)
+    fanout_parser.add_argument("--slow-delay", type=float, default=0.05)
+    fanout_parser.add_argument("--messages", type=int, default=200)
+    fanout_parser.add_argument("--sequential-messages", type=int, default=3)
+    fanout_parser.add_argument("--queue-size", type=int, default=64)
+    fanout_parser.set_defaults(func=fanout)
+
+    serialize_parser = commands.add_parser("serialize", help="кодирование и рассылка одного сообщения")
+    serialize_parser.add_argument("--sockets", type=int, default=1000)
+    serialize_parser.add_argument("--items", type=int, default=50)
+    serialize_parser.add_argument("--messages", type=int, default=50)
+    serialize_parser.add_argument("--sequential-messages", type=int, default=3)
+    serialize_parser.add_argument("--binary-share", type=float, default=0.5)
+    serialize_parser.set_defaults(func=serialize)
+
+    churn_parser = commands.add_parser("churn", help="массовое подключение и отключение")
+    churn_parser.add_argument("--sockets", type=int, default=10_000)
+    churn_parser.add_argument("--rooms", type=int, default=1)
+    churn_parser.set_defaults(func=churn)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Задержка GET /wishlists/{id} (вишлист владельца) при 10, 100 и 1000 товарах.
+
+Запуск из app/backend; по умолчанию — временная SQLite, для PostgreSQL задайте
+DATABASE_URL отдельной базы (таблицы в ней создаются, данные остаются):
+
+    python -m benchmarks.bench_wishlist_detail [--sizes 10 100 1000] [--repeat 50]
+
+Данные создаются только через API, поэтому скрипт работает и на старых коммитах.
+Сравнение «до/после» группировки агрегатов:
+
+    git worktree add /tmp/before 5b15db9~1
+    cd /tmp/before/app/backend
+    PYTHONPATH=. python /path/to/app/backend/benchmarks/bench_wishlist_detail.py
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+if "DATABASE_URL" not in os.environ:
+    _path = os.path.join(tempfile.mkdtemp(prefix="wishlist-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_path}"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("REVALIDATION_ENABLED", "false")
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "thread")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import Base, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def _check(response, expected: int = 200):
+    assert response.status_code == expected, (response.request.url, response.text)
+    return response
+
+
+def _seed(client: TestClient, size: int) -> tuple[int, dict]:
+    """Вишлист из size товаров: чётные — одиночные с резервом, нечётные — групповые с двумя вкладами."""
+    email = f"{uuid.uuid4().hex}@example.com"
+    _check(client.post("/auth/register", json={"email": email, "password": "benchmark"}))
+    token = _check(client.post("/auth/login", data={"username": email, "password": "benchmark"})).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    wishlist = _check(client.post("/wishlists", json={"title": f"{size} items"}, headers=headers), 201).json()
+    for i in range(size):
+        group = i % 2 == 1
+        item = _check(
+            client.post(
+                f"/items/wishlist/{wishlist['id']}",
+                json={"title": f"Item {i}", "price_cents": 10_000, "allow_group_funding": group},
+                headers=headers,
+            ),
+            201,
+        ).json()
+        if group:
+            for n in range(2):
+                _check(
+                    client.post(
+                        f"/items/{item['id']}/contributions",
+                        json={"contributor_name": f"Guest {n}", "amount_cents": 1_000},
+                    ),
+                    201,
+                )
+        else:
+            _check(client.post(f"/items/{item['id']}/reserve", json={"reserver_name": "Guest"}), 201)
+    return wishlist["id"], headers
+
+
+def _measure(client: TestClient, wishlist_id: int, headers: dict, repeat: int) -> tuple[list[float], int]:
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    timings = []
+    for _ in range(repeat):
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count)
+        started = time.perf_counter()
+        _check(client.get(f"/wishlists/{wishlist_id}", headers=headers))
+        timings.append((time.perf_counter() - started) * 1000)
+        event.remove(engine, "before_cursor_execute", count)
+    return timings, len(statements)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    print(f"db={engine.dialect.name} repeat={args.repeat}")
+    print(f"{'items':>6}{'queries':>9}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    with TestClient(app) as client:
+        for size in args.sizes:
+            wishlist_id, headers = _seed(client, size)
+            timings, queries = _measure(client, wishlist_id, headers, args.repeat)
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            print(f"{size:>6}{queries:>9}{statistics.median(timings):>10.2f}{p95:>10.2f}{max(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
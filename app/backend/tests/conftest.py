@@ -0,0 +1,96 @@
+"""Общие фикстуры тестов.
+
+По умолчанию тесты идут на временной SQLite. Тесты блокировок и планов
+запросов требуют PostgreSQL: TEST_DATABASE_URL=postgresql://... (отдельная
+база — схема в ней пересоздаётся).
+"""
+
+import asyncio
+import os
+import tempfile
+import uuid
+from typing import Optional
+
+import pytest
+
+# Settings читаются при импорте app.*, поэтому окружение задаётся до него
+_test_url = os.environ.get("TEST_DATABASE_URL")
+if _test_url:
+    os.environ["DATABASE_URL"] = _test_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+else:
+    _path = os.path.join(tempfile.mkdtemp(prefix="wishlist-tests-"), "test.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_path}"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["REALTIME_BROKER"] = "memory"
+os.environ["REVALIDATION_ENABLED"] = "false"
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "thread")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from app.db import Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.models import Contribution, Reservation, User, Wishlist, WishlistItem  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def run():
+    """Выполняет async-функцию в отдельном event loop.
+
+    Пул async-движка привязан к loop'у, в котором открыты соединения,
+    поэтому в конце он закрывается.
+    """
+
+    def runner(func, *args):
+        async def main():
+            try:
+                return await func(*args)
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return runner
+
+
+@pytest.fixture
+def make_wishlist(db):
+    """Вишлист с items товарами, у каждого — reservations резервов с contributions вкладами."""
+
+    def factory(
+        items: int = 0, reservations: int = 0, contributions: int = 0, owner: Optional[User] = None, **item_fields
+    ) -> Wishlist:
+        owner = owner or User(email=f"{uuid.uuid4().hex}@example.com", password_hash="-")
+        wishlist = Wishlist(owner=owner, title="Test", public_slug=uuid.uuid4().hex[:12])
+        for i in range(items):
+            item = WishlistItem(title=f"Item {i}", price_cents=1000, **item_fields)
+            wishlist.items.append(item)
+            for r in range(reservations):
+                reservation = Reservation(reserver_name=f"Guest {r}", is_group=contributions > 0)
+                item.reservations.append(reservation)
+                for _ in range(contributions):
+                    reservation.contributions.append(
+                        Contribution(amount_cents=100, contributor_name="Guest")
+                    )
+            # счётчики, которые в приложении ведут reservations.py
+            item.reservation_count = reservations
+            item.contribution_count = reservations * contributions
+            item.collected_amount_cents = reservations * contributions * 100
+        db.add(wishlist)
+        db.commit()
+        return wishlist
+
+    return factory
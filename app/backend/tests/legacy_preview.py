@@ -0,0 +1,143 @@
+"""Извлечение превью до перехода на однопроходный _extract_candidates.
+
+Зафиксированная копия старого кода — эталон для test_preview_extract.py
+и benchmarks/bench_preview_extract.py. Не менять.
+"""
+
+import json
+import re
+from typing import Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+
+HTML_PARSER = "html.parser"
+
+
+def _parse_html(html: str, url: str) -> dict:
+    result = {"title": None, "image_url": None, "price_cents": None}
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    # Open Graph — заголовок
+    og_title = soup.find("meta", property="og:title")
+    if og_title and og_title.get("content"):
+        result["title"] = og_title["content"].strip()[:500]
+    if not result["title"]:
+        title_tag = soup.find("title")
+        if title_tag and title_tag.string:
+            result["title"] = title_tag.string.strip()[:500]
+
+    # Картинка: og:image, twitter:image, JSON-LD, link rel
+    result["image_url"] = _extract_image(soup, url)
+
+    # Цена
+    price_cents = _extract_price(soup, html)
+    if price_cents is not None:
+        result["price_cents"] = price_cents
+    return result
+
+
+def _extract_image(soup: BeautifulSoup, base_url: str) -> Optional[str]:
+    """Извлекает URL картинки из страницы товара."""
+    # Open Graph
+    for prop in ("og:image", "og:image:url", "twitter:image"):
+        meta = soup.find("meta", attrs={"property": prop}) or soup.find("meta", attrs={"name": prop})
+        if meta and meta.get("content"):
+            img = meta["content"].strip()
+            if img.startswith("//"):
+                img = "https:" + img
+            elif img.startswith("/"):
+                parsed = urlparse(base_url)
+                img = f"{parsed.scheme}://{parsed.netloc}{img}"
+            return img[:2000] if img.startswith("http") else None
+
+    # JSON-LD Product image
+    for script in soup.find_all("script", type="application/ld+json"):
+        if not script.string:
+            continue
+        try:
+            data = json.loads(script.string)
+            items = [data] if isinstance(data, dict) else (data if isinstance(data, list) else [])
+            for item in items:
+                img = item.get("image")
+                if img:
+                    url_str = img if isinstance(img, str) else (img.get("url") if isinstance(img, dict) else (img[0] if isinstance(img, list) else None))
+                    if url_str and url_str.startswith("http"):
+                        return url_str[:2000]
+        except Exception:
+            continue
+
+    # link rel="image_src"
+    link = soup.find("link", rel="image_src")
+    if link and link.get("href"):
+        href = link["href"].strip()
+        if href.startswith("//"):
+            href = "https:" + href
+        if href.startswith("http"):
+            return href[:2000]
+
+    return None
+
+
+def _extract_price(soup: BeautifulSoup, raw_html: str) -> Optional[int]:
+    # JSON-LD Product
+    for script in soup.find_all("script", type="application/ld+json"):
+        if not script.string:
+            continue
+        try:
+            data = json.loads(script.string)
+            if isinstance(data, dict):
+                data = [data]
+            for item in data if isinstance(data, list) else [data]:
+                offers = item.get("offers") or {}
+                if isinstance(offers, list) and offers:
+                    offers = offers[0]
+                price = offers.get("price") if isinstance(offers, dict) else item.get("price")
+                if price is not None:
+                    p = float(price)
+                    return int(round(p * 100))
+        except Exception:
+            continue
+
+    # Мета-теги и data-атрибуты
+    for meta in soup.find_all("meta", property=re.compile(r"product:price|price", re.I)):
+        content = meta.get("content") or meta.get("value")
+        if content:
+            num = _parse_price_string(content)
+            if num is not None:
+                return num
+
+    # Типичные классы/селекторы
+    for sel in ["[itemprop=price]", ".price", "[data-price]", ".product-price", ".ProductPrice"]:
+        el = soup.select_one(sel)
+        if el:
+            content = el.get("content") or el.get("data-price") or (el.get_text(strip=True) if el else None)
+            if content:
+                num = _parse_price_string(str(content))
+                if num is not None:
+                    return num
+
+    # Поиск по тексту страницы: число и "руб" / "₽"
+    match = re.search(r"(\d[\d\s]*[,.]?\d*)\s*(?:руб|₽|р\.)", raw_html, re.I)
+    if match:
+        num = _parse_price_string(match.group(1))
+        if num is not None and 100 <= num <= 100_000_00:  # от 1 руб до 1М
+            return num
+
+    return None
+
+
+def _parse_price_string(s: str) -> Optional[int]:
+    if not s:
+        return None
+    s = re.sub(r"[\s\u00a0]", "", s)
+    s = s.replace(",", ".")
+    match = re.search(r"(\d+\.?\d*)", s)
+    if not match:
+        return None
+    try:
+        value = float(match.group(1))
+        return int(round(value * 100))
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,137 @@
+"""Брокеры realtime-событий: в памяти и Redis pub/sub на fakeredis вместо сервера."""
+
+import asyncio
+
+import pytest
+
+from app.broker import InMemoryBroker, RedisBroker
+from app.realtime import ConnectionManager
+from tests.utils import FakeWebSocket
+
+
+def _redis_brokers(count: int) -> list[RedisBroker]:
+    """Брокеры «разных воркеров» над одним fakeredis-сервером."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return [RedisBroker(fakeredis.FakeAsyncRedis(server=server)) for _ in range(count)]
+
+
+def test_in_memory_broker_numbers_events_per_room(run):
+    async def scenario():
+        manager = ConnectionManager(broker=InMemoryBroker())
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("1", first)
+        await manager.connect("2", second)
+
+        await manager.broadcast("1", {"type": "a"})
+        await manager.broadcast("1", {"type": "b"})
+        await manager.broadcast("2", {"type": "c"})
+        # в комнату без сокетов этого процесса ничего не публикуется
+        await manager.broadcast("3", {"type": "d"})
+
+        assert await first.wait_messages(2) == [{"type": "a", "seq": 1}, {"type": "b", "seq": 2}]
+        assert await second.wait_messages(1) == [{"type": "c", "seq": 1}]
+        assert manager.events_in == 3
+
+        manager.disconnect("1", first)
+        await asyncio.sleep(0)
+        assert await manager.broker.next_seq("1") == 1
+        await manager.close()
+
+    run(scenario)
+
+
+def test_redis_broker_delivers_between_workers(run):
+    async def scenario():
+        publisher, subscriber = (ConnectionManager(broker=broker) for broker in _redis_brokers(2))
+        local, remote = FakeWebSocket(), FakeWebSocket()
+        await publisher.connect("1", local)
+        await subscriber.connect("1", remote)
+
+        for kind in ("a", "b", "c"):
+            await publisher.broadcast("1", {"type": kind})
+        await subscriber.broadcast("1", {"type": "d"})
+
+        expected = [{"type": kind, "seq": seq} for seq, kind in enumerate("abcd", start=1)]
+        # seq общий для воркеров — его выдаёт INCR в Redis
+        assert await remote.wait_messages(4) == expected
+        assert await local.wait_messages(4) == expected
+
+        await publisher.close()
+        await subscriber.close()
+
+    run(scenario)
+
+
+def test_redis_broker_stops_delivery_after_last_socket_leaves(run):
+    async def scenario():
+        publisher, subscriber = (ConnectionManager(broker=broker) for broker in _redis_brokers(2))
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await subscriber.connect("1", first)
+        await subscriber.connect("2", second)
+
+        subscriber.disconnect("1", first)
+        # _release отписывает комнату в фоне
+        await asyncio.sleep(0.05)
+        numsub = await publisher.broker.client.pubsub_numsub("ws:room:1", "ws:room:2")
+        assert [count for _, count in numsub] == [0, 1]
+
+        await publisher.broadcast("2", {"type": "kept"})
+        assert await second.wait_messages(1) == [{"type": "kept", "seq": 1}]
+
+        await publisher.close()
+        await subscriber.close()
+
+    run(scenario)
+
+
+
+class BrokenBroker(InMemoryBroker):
+    """Брокер, у которого отказал Redis: next_seq падает всегда, subscribe — по флагу."""
+
+    def __init__(self, fail_subscribe: bool = False) -> None:
+        super().__init__()
+        self.fail_subscribe = fail_subscribe
+
+    async def next_seq(self, room: str) -> int:
+        raise ConnectionError("redis is down")
+
+    async def subscribe(self, room: str) -> None:
+        if self.fail_subscribe:
+            raise ConnectionError("redis is down")
+
+
+def test_broker_failure_does_not_reach_the_write_handler(run, caplog):
+    async def scenario():
+        manager = ConnectionManager(broker=BrokenBroker())
+        socket = FakeWebSocket()
+        await manager.connect("1", socket)
+
+        # данные уже закоммичены — broadcast не должен превращать запрос в 500
+        await manager.broadcast("1", {"type": "a"})
+        assert "комнаты 1" in caplog.text
+        assert manager.frames_out == 0
+
+        manager.disconnect_all(socket)
+        await manager.close()
+
+    run(scenario)
+
+
+def test_failed_subscribe_leaves_no_connection_behind(run):
+    async def scenario():
+        manager = ConnectionManager(broker=BrokenBroker(fail_subscribe=True))
+        socket = FakeWebSocket()
+        baseline = len(asyncio.all_tasks())
+
+        with pytest.raises(ConnectionError):
+            await manager.connect("1", socket)
+        await asyncio.sleep(0)
+
+        assert manager.connection_count == 0
+        assert not manager.active_connections and not manager._socket_rooms
+        # писатель отменён, _release отработал
+        assert len(asyncio.all_tasks()) == baseline
+        await manager.close()
+
+    run(scenario)
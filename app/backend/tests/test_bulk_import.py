@@ -0,0 +1,49 @@
+"""Массовый импорт: лимиты размера тела и числа строк проверяются до разбора."""
+
+import json
+
+import pytest
+
+from app.core.config import settings
+from tests.utils import api_client, auth_headers
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "bulk_import_max_bytes", 256)
+    monkeypatch.setattr(settings, "bulk_import_max_items", 3)
+
+
+def _rows(count: int) -> list[dict]:
+    return [{"title": f"Row {i}"} for i in range(count)]
+
+
+async def _chunked(data: bytes):
+    # без Content-Length: лимит срабатывает по мере чтения
+    for start in range(0, len(data), 64):
+        yield data[start:start + 64]
+
+
+def test_bulk_import_limits(run, make_wishlist, limits):
+    wishlist = make_wishlist()
+    url = f"/items/wishlist/{wishlist.id}/bulk"
+    headers = auth_headers(wishlist.owner)
+    ndjson = {**headers, "Content-Type": "application/x-ndjson"}
+    array = {**headers, "Content-Type": "application/json"}
+    oversized = json.dumps(_rows(2) + [{"title": "x" * 300}]).encode()
+
+    async def scenario():
+        async with api_client() as client:
+            ok = await client.post(url, json=_rows(3), headers=headers)
+            by_length = await client.post(url, content=oversized, headers=array)
+            streamed = await client.post(url, content=_chunked(oversized), headers=ndjson)
+            too_many = await client.post(
+                url, content=b"\n".join(json.dumps(row).encode() for row in _rows(4)), headers=ndjson
+            )
+            return ok, by_length, streamed, too_many
+
+    ok, by_length, streamed, too_many = run(scenario)
+    assert ok.status_code == 201 and [item["title"] for item in ok.json()] == ["Row 0", "Row 1", "Row 2"]
+    assert by_length.status_code == 413 and "bytes" in by_length.json()["detail"]
+    assert streamed.status_code == 413 and "bytes" in streamed.json()["detail"]
+    assert too_many.status_code == 413 and "items" in too_many.json()["detail"]
@@ -0,0 +1,63 @@
+"""Однопроходный _extract_candidates должен давать то же, что старые _extract_image/_extract_price."""
+
+from pathlib import Path
+
+import pytest
+
+from app.routers import preview
+from tests import legacy_preview
+
+FIXTURES = Path(__file__).parent / "fixtures" / "preview"
+PAGE_URL = "https://shop.example/p/1"
+FIELDS = ("title", "image_url", "price_cents")
+
+PARSERS = ["html.parser"]
+try:
+    import lxml  # noqa: F401
+    PARSERS.append("lxml")
+except ImportError:
+    pass
+
+
+def _fixtures():
+    return sorted(FIXTURES.glob("*.html"))
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("path", _fixtures(), ids=lambda p: p.stem)
+def test_matches_legacy_extractor(path, parser, monkeypatch):
+    html = path.read_text(encoding="utf-8")
+    monkeypatch.setattr(preview, "HTML_PARSER", parser)
+    monkeypatch.setattr(legacy_preview, "HTML_PARSER", parser)
+
+    new = preview._parse_html(html, PAGE_URL)
+    old = legacy_preview._parse_html(html, PAGE_URL)
+
+    assert {k: new[k] for k in FIELDS} == old
+
+
+def test_fixtures_cover_fallbacks():
+    """Каждая ветка старого кода срабатывает хотя бы на одной фикстуре."""
+    pages = {p.stem: legacy_preview._parse_html(p.read_text(encoding="utf-8"), PAGE_URL) for p in _fixtures()}
+
+    assert pages["og_tags"]["image_url"] == "https://cdn.example/x.jpg"
+    assert pages["twitter_name_and_rub_text"]["image_url"] == "https://shop.example/rel.png"
+    assert pages["twitter_name_and_rub_text"]["price_cents"] == 599000
+    assert pages["jsonld_list"]["image_url"] == "https://i.example/1.jpg"
+    assert pages["jsonld_broken_then_valid"]["price_cents"] == 1500
+    assert pages["meta_price_and_image_src"]["image_url"] == "https://a.example/b.jpg"
+    assert pages["meta_price_and_image_src"]["price_cents"] == 250000
+    assert pages["itemprop_price"] == {"title": None, "image_url": None, "price_cents": 7700}
+    assert pages["data_price"]["price_cents"] == 150000
+    assert pages["jsonld_empty_offers"]["price_cents"] == 1200  # item.price при пустом offers не читается
+    assert pages["jsonld_item_price"]["price_cents"] == 850
+    assert pages["marketplace_no_meta"]["price_cents"] == 3999900
+    assert pages["nothing"] == {"title": None, "image_url": None, "price_cents": None}
+
+
+def test_extracts_currency_and_availability():
+    html = (FIXTURES / "out_of_stock_in_body.html").read_text(encoding="utf-8")
+    result = preview._parse_html(html, PAGE_URL)
+
+    assert result["availability"] == "OutOfStock"
+    assert result["price_cents"] == 4599000
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import engine
+from app.main import app
+
+
+client = TestClient(app)
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _public_query_count(wishlist) -> int:
+    with count_queries() as statements:
+        response = client.get(f"/wishlists/public/{wishlist.public_slug}")
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_public_wishlist_query_count_does_not_grow_with_items(make_wishlist):
+    small = make_wishlist(items=2, reservations=1, contributions=2, allow_group_funding=True)
+    large = make_wishlist(items=40, reservations=3, contributions=4, allow_group_funding=True)
+
+    assert _public_query_count(small) == _public_query_count(large)
+
+
+def test_public_wishlist_payload(make_wishlist):
+    wishlist = make_wishlist(items=3, reservations=1, contributions=2, allow_group_funding=True)
+
+    body = client.get(f"/wishlists/public/{wishlist.public_slug}").json()
+
+    assert [item["title"] for item in body["items"]] == ["Item 0", "Item 1", "Item 2"]
+    item = body["items"][0]
+    assert item["collected_amount_cents"] == 200
+    assert item["contribution_count"] == 2
+    assert [c["amount_cents"] for c in item["reservations"][0]["contributions"]] == [100, 100]
+
+
+def test_cached_public_wishlist_runs_no_queries(make_wishlist):
+    wishlist = make_wishlist(items=5, reservations=1)
+    client.get(f"/wishlists/public/{wishlist.public_slug}")
+
+    with count_queries() as statements:
+        response = client.get(f"/wishlists/public/{wishlist.public_slug}")
+
+    assert response.status_code == 200
+    assert statements == []
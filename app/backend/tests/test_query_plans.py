@@ -0,0 +1,92 @@
+"""EXPLAIN для каждого запроса, который выполняют роутеры.
+
+Обработчики вызываются как обычно, а слушатель на обоих движках прогоняет
+каждый SELECT/UPDATE/DELETE через EXPLAIN с теми же параметрами и
+enable_seqscan = off. Если в плане всё равно Seq Scan — подходящего
+индекса нет.
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.db import async_engine, engine
+from tests.utils import api_client, auth_headers, requires_postgres
+
+pytestmark = requires_postgres
+
+
+@contextmanager
+def explain_queries():
+    plans: dict[str, str] = {}
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            return
+        # отдельный курсор того же соединения: результат исходного запроса ещё не прочитан
+        explain = conn.connection.dbapi_connection.cursor()
+        try:
+            explain.execute("SET enable_seqscan = off")
+            explain.execute("EXPLAIN " + statement, parameters)
+            plans[statement] = "\n".join(row[0] for row in explain.fetchall())
+            explain.execute("RESET enable_seqscan")
+        finally:
+            explain.close()
+
+    targets = (engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "after_cursor_execute", after_cursor_execute)
+    try:
+        yield plans
+    finally:
+        for target in targets:
+            event.remove(target, "after_cursor_execute", after_cursor_execute)
+
+
+async def _exercise_routers(headers: dict, wishlist_id: int, slug: str, item_id: int) -> None:
+    async with api_client() as client:
+        calls = [
+            client.get("/auth/me", headers=headers),
+            client.get("/wishlists/me", headers=headers),
+            client.get(f"/wishlists/{wishlist_id}", headers=headers),
+            client.patch(f"/wishlists/{wishlist_id}", json={"title": "Renamed"}, headers=headers),
+            client.get(f"/wishlists/public/{slug}"),
+            client.get(f"/wishlists/public/{slug}/items/{item_id}"),
+            client.post(f"/items/wishlist/{wishlist_id}", json={"title": "New"}, headers=headers),
+            client.patch(
+                f"/items/{item_id}",
+                json={"title": "Renamed", "allow_group_funding": True, "target_amount_cents": 100_000},
+                headers=headers,
+            ),
+            client.post(f"/items/{item_id}/reserve", json={"reserver_name": "Guest"}),
+            client.post(
+                f"/items/{item_id}/contributions", json={"contributor_name": "Guest", "amount_cents": 100}
+            ),
+        ]
+        for call in calls:
+            response = await call
+            assert response.status_code < 400, (response.request.url, response.text)
+
+        # keyset-пагинация: первая страница и следующая по курсору
+        page = await client.get("/wishlists/me", params={"limit": 1}, headers=headers)
+        cursor = page.headers["X-Next-Cursor"]
+        await client.get("/wishlists/me", params={"limit": 1, "cursor": cursor}, headers=headers)
+        for path in (f"/items/{item_id}", f"/wishlists/{wishlist_id}"):
+            response = await client.delete(path, headers=headers)
+            assert response.status_code == 204, (path, response.text)
+
+
+def test_router_queries_use_indexes(run, make_wishlist):
+    wishlist = make_wishlist(
+        items=3, reservations=1, contributions=2, allow_group_funding=True, target_amount_cents=100_000
+    )
+    # второй вишлист того же владельца, чтобы у списка была следующая страница
+    make_wishlist(items=1, owner=wishlist.owner)
+    args = (auth_headers(wishlist.owner), wishlist.id, wishlist.public_slug, wishlist.items[0].id)
+
+    with explain_queries() as plans:
+        run(_exercise_routers, *args)
+
+    assert plans
+    seq_scans = {statement: plan for statement, plan in plans.items() if "Seq Scan" in plan}
+    assert not seq_scans, "\n\n".join(f"{statement}\n{plan}" for statement, plan in seq_scans.items())
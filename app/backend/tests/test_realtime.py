@@ -0,0 +1,70 @@
+"""Рассылка в большую комнату: медленный клиент не задерживает остальных."""
+
+import asyncio
+
+import pytest
+
+from app.realtime import ConnectionManager
+from tests.utils import FakeWebSocket
+
+SOCKETS = 5000
+MESSAGES = 20
+QUEUE_SIZE = 8
+
+
+async def _fill_room(manager: ConnectionManager) -> tuple[FakeWebSocket, list[FakeWebSocket]]:
+    stalled = FakeWebSocket(stalled=True)
+    sockets = [FakeWebSocket() for _ in range(SOCKETS - 1)]
+    for socket in [stalled, *sockets]:
+        await manager.connect("1", socket)
+    return stalled, sockets
+
+
+@pytest.mark.parametrize("policy", ["drop", "disconnect"])
+def test_broadcast_to_5k_sockets_with_stalled_client(run, policy):
+    async def scenario():
+        manager = ConnectionManager(queue_size=QUEUE_SIZE, slow_consumer_policy=policy)
+        stalled, sockets = await _fill_room(manager)
+
+        for n in range(MESSAGES):
+            await manager.broadcast("1", {"type": "event", "n": n})
+            await asyncio.sleep(0)
+
+        expected = [{"type": "event", "n": n, "seq": n + 1} for n in range(MESSAGES)]
+        for socket in sockets:
+            assert await socket.wait_messages(MESSAGES) == expected
+        assert stalled.sent == []
+        # сериализация — один раз на сообщение, а не на сокет
+        assert manager.frames_out == MESSAGES
+
+        if policy == "drop":
+            # писатель застрял на первом кадре, ещё QUEUE_SIZE ждут в очереди
+            assert manager.dropped_messages == MESSAGES - 1 - QUEUE_SIZE
+            assert manager.connection_count == SOCKETS
+        else:
+            await asyncio.sleep(0)
+            assert manager.slow_disconnects == 1
+            assert stalled.closed_with == 1013
+            assert manager.connection_count == SOCKETS - 1
+
+        for socket in [stalled, *sockets]:
+            manager.disconnect_all(socket)
+        await manager.close()
+
+    run(scenario)
+
+
+def test_background_tasks_are_kept_until_done(run):
+    async def scenario():
+        manager = ConnectionManager()
+        socket = FakeWebSocket()
+        await manager.connect("1", socket)
+
+        manager.disconnect("1", socket)
+        # _release комнаты держится менеджером, пока не завершится
+        [release] = manager._background
+        await release
+        assert manager._background == set()
+        await manager.close()
+
+    run(scenario)
@@ -0,0 +1,27 @@
+"""Сверка счётчиков wishlist_items: --fix не затирает записи, сделанные после отчёта."""
+
+from app.models import Contribution
+from app.reconcile import find_drift, repair
+
+
+def test_repair_recounts_instead_of_writing_the_report(db, make_wishlist):
+    wishlist = make_wishlist(items=2, reservations=1, contributions=2, allow_group_funding=True)
+    broken, intact = wishlist.items
+    broken.reservation_count = 0
+    broken.collected_amount_cents = 0
+    db.commit()
+
+    drift = find_drift(db)
+    assert [row["id"] for row in drift] == [broken.id]
+
+    # вклад, закоммиченный между отчётом и исправлением
+    broken.reservations[0].contributions.append(Contribution(amount_cents=500, contributor_name="Late"))
+    broken.collected_amount_cents += 500
+    broken.contribution_count += 1
+    db.commit()
+
+    repair(db, drift)
+    db.expire_all()
+    assert (broken.reservation_count, broken.contribution_count, broken.collected_amount_cents) == (1, 3, 700)
+    assert (intact.reservation_count, intact.contribution_count, intact.collected_amount_cents) == (1, 2, 200)
+    assert find_drift(db) == []
@@ -0,0 +1,52 @@
+"""Параллельные резервы и вклады: SELECT ... FOR UPDATE не даёт превысить лимиты.
+
+Только PostgreSQL — SQLite не блокирует строки и сериализует запись целиком.
+"""
+
+import asyncio
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from app.models import Contribution, Reservation
+from tests.utils import api_client, requires_postgres
+
+pytestmark = requires_postgres
+
+
+async def _post_all(path: str, payloads: list[dict]) -> Counter:
+    async with api_client() as client:
+        responses = await asyncio.gather(*(client.post(path, json=payload) for payload in payloads))
+    return Counter(response.status_code for response in responses)
+
+
+def test_parallel_reservations_of_single_gift(run, db, make_wishlist):
+    item = make_wishlist(items=1).items[0]
+    payloads = [{"reserver_name": f"Guest {i}"} for i in range(300)]
+
+    statuses = run(_post_all, f"/items/{item.id}/reserve", payloads)
+
+    assert statuses == {201: 1, 400: 299}
+    assert db.scalar(select(func.count()).select_from(Reservation).where(Reservation.item_id == item.id)) == 1
+    db.refresh(item)
+    assert item.reservation_count == 1
+
+
+def test_parallel_contributions_never_overshoot_target(run, db, make_wishlist):
+    item = make_wishlist(items=1, allow_group_funding=True, target_amount_cents=10_000).items[0]
+    # 400 вкладов по 70 — на цель 10 000 хватает 142, остальные должны получить 400
+    payloads = [{"contributor_name": f"Guest {i}", "amount_cents": 70} for i in range(400)]
+
+    statuses = run(_post_all, f"/items/{item.id}/contributions", payloads)
+
+    assert statuses == {201: 142, 400: 258}
+    group_reservations = db.scalars(select(Reservation).where(Reservation.item_id == item.id)).all()
+    assert len(group_reservations) == 1
+    collected, count = db.execute(
+        select(func.sum(Contribution.amount_cents), func.count()).where(
+            Contribution.reservation_id == group_reservations[0].id
+        )
+    ).one()
+    assert collected == 142 * 70 <= 10_000
+    db.refresh(item)
+    assert (item.collected_amount_cents, item.contribution_count, item.reservation_count) == (collected, count, 1)
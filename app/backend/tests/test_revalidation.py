@@ -0,0 +1,159 @@
+"""Перепроверка источников против локального HTTP-сервера."""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.models import WishlistItem
+from app.revalidation import HostRateLimiter, revalidate_batch
+from app.routers import preview
+
+FIXTURES = Path(__file__).parent / "fixtures" / "preview"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # путь -> (статус, имя фикстуры)
+    routes = {
+        "/out-of-stock": (200, "out_of_stock_in_body.html"),
+        "/in-stock": (200, "product_page.html"),
+        "/gone": (404, None),
+        "/broken": (503, None),
+    }
+
+    def do_GET(self):
+        code, fixture = self.routes.get(self.path, (404, None))
+        body = (FIXTURES / fixture).read_bytes() if fixture else b"not found"
+        self.send_response(code)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _with_client(func):
+    """httpx-клиент превью привязан к loop'у — закрываем его в том же loop'е."""
+
+    async def wrapper(*args):
+        try:
+            return await func(*args)
+        finally:
+            await preview.close_client()
+
+    return wrapper
+
+
+def test_check_source_reads_availability_from_body(run, stub_url):
+    # в <head> есть title, картинка и цена, OutOfStock — только в JSON-LD в <body>
+    status = run(_with_client(preview.check_source), f"{stub_url}/out-of-stock")
+
+    assert status["status_code"] == 200
+    assert status["availability"] == "OutOfStock"
+    assert status["price_cents"] == 4599000
+
+
+def test_check_source_reports_status_code(run, stub_url):
+    assert run(_with_client(preview.check_source), f"{stub_url}/gone")["status_code"] == 404
+
+
+@pytest.mark.parametrize("url", ["http://[::1/xxxxxxxx", "http://127.0.0.1:1/closed"])
+def test_check_source_returns_none_when_source_unreachable(run, url):
+    assert run(_with_client(preview.check_source), url) is None
+
+
+def test_revalidate_batch(run, db, make_wishlist, stub_url):
+    wishlist = make_wishlist(items=6)
+    urls = [
+        f"{stub_url}/out-of-stock",  # недоступен по JSON-LD
+        f"{stub_url}/gone",  # 404 — недоступен
+        f"{stub_url}/in-stock",  # в наличии, цена изменилась
+        f"{stub_url}/broken",  # 503 — не трогаем
+        "http://[::1/xxxxxxxx",  # битая ссылка не срывает проход по остальным
+        "ftp://shop.example/item",
+    ]
+    items = sorted(wishlist.items, key=lambda item: item.id)
+    for item, url in zip(items, urls):
+        item.url = url
+    db.commit()
+    rows = db.scalars(
+        select(WishlistItem).where(WishlistItem.wishlist_id == wishlist.id).order_by(WishlistItem.id)
+    ).all()
+    db.expunge_all()
+
+    changes = run(_with_client(revalidate_batch), list(rows), HostRateLimiter(0))
+
+    by_id = {change["id"]: change for change in changes}
+    assert set(by_id) == {items[0].id, items[1].id, items[2].id}
+    assert by_id[items[0].id]["source_unavailable"] is True
+    assert by_id[items[1].id]["source_unavailable"] is True
+    assert by_id[items[2].id] == {
+        "id": items[2].id,
+        "wishlist_id": wishlist.id,
+        "source_unavailable": False,
+        "price_cents": 3299000,
+    }
+
+    stored = {
+        item.id: (item.source_unavailable, item.price_cents)
+        for item in db.scalars(select(WishlistItem).where(WishlistItem.wishlist_id == wishlist.id))
+    }
+    assert stored[items[0].id] == (True, 4599000)
+    assert stored[items[1].id] == (True, 1000)
+    assert stored[items[2].id] == (False, 3299000)
+    assert stored[items[3].id] == (False, 1000)
+
+
+def test_revalidate_batch_keeps_owner_edit_made_after_read(run, db, make_wishlist, stub_url):
+    wishlist = make_wishlist(items=1)
+    item = wishlist.items[0]
+    item.url = f"{stub_url}/in-stock"
+    db.commit()
+    rows = db.scalars(select(WishlistItem).where(WishlistItem.wishlist_id == wishlist.id)).all()
+    db.expunge_all()
+
+    # владелец правит цену, пока батч ждёт ответа источника
+    db.get(WishlistItem, item.id).price_cents = 2500
+    db.commit()
+
+    changes = run(_with_client(revalidate_batch), list(rows), HostRateLimiter(0))
+
+    assert changes == []
+    db.expire_all()
+    assert db.get(WishlistItem, item.id).price_cents == 2500
+
+
+def test_host_interval_is_waited_outside_the_semaphore(run):
+    async def scenario():
+        limiter = HostRateLimiter(0.2)
+        semaphore = asyncio.Semaphore(1)
+        started = {}
+
+        async def fetch(name, host):
+            async with limiter.slot(host, semaphore):
+                started[name] = time.monotonic()
+
+        t0 = time.monotonic()
+        await fetch("a1", "a")
+        # a2 ждёт паузы хоста a, место в semaphore тем временем достаётся b
+        await asyncio.gather(fetch("a2", "a"), fetch("b", "b"))
+        assert started["b"] - t0 < 0.1
+        assert started["a2"] - started["a1"] >= 0.2
+
+    run(scenario)
@@ -0,0 +1,124 @@
+"""Доступ к комнате вишлиста и содержимое событий WebSocket."""
+
+import asyncio
+from typing import Optional
+
+import pytest
+
+from app.core.security import create_access_token
+from app.realtime import manager
+from app.routers.ws import _wishlist_ws_handler
+from tests.utils import FakeWebSocket, api_client
+
+
+class ClientSocket(FakeWebSocket):
+    """Клиент, который подключился и слушает, пока тест его не отпустит."""
+
+    def __init__(self, token: Optional[str] = None) -> None:
+        super().__init__()
+        self.query_params = {"token": token} if token else {}
+        self.scope = {"subprotocols": []}
+        self.accepted = False
+        self.gone = asyncio.Event()
+
+    async def accept(self, subprotocol=None) -> None:
+        self.accepted = True
+
+    async def receive(self) -> dict:
+        await self.gone.wait()
+        return {"type": "websocket.disconnect"}
+
+
+@pytest.fixture(autouse=True)
+def quiet_manager(monkeypatch):
+    # без heartbeat и склейки: в сокет приходят ровно разосланные события
+    monkeypatch.setattr(manager, "ping_interval", 0)
+    monkeypatch.setattr(manager, "coalesce_window", 0)
+
+
+def _token(user) -> str:
+    return create_access_token({"sub": user.email, "uid": user.id})
+
+
+async def _join(wishlist_id: int, token: Optional[str] = None) -> tuple[ClientSocket, asyncio.Task]:
+    socket = ClientSocket(token)
+    handler = asyncio.create_task(_wishlist_ws_handler(socket, wishlist_id))
+    # отказ завершает обработчик сразу, принятый сокет остаётся в комнате
+    await asyncio.sleep(0.05)
+    return socket, handler
+
+
+async def _leave(socket: ClientSocket, handler: asyncio.Task) -> None:
+    socket.gone.set()
+    await handler
+
+
+def test_private_wishlist_room_is_owner_only(run, db, make_wishlist):
+    wishlist = make_wishlist(items=1)
+    wishlist.is_public = False
+    db.commit()
+    stranger = make_wishlist().owner
+
+    async def scenario():
+        for token in (None, _token(stranger), "not-a-token"):
+            socket, handler = await _join(wishlist.id, token)
+            assert handler.done() and not socket.accepted
+            assert socket.closed_with == 1008
+
+        socket, handler = await _join(wishlist.id, _token(wishlist.owner))
+        assert socket.accepted and not handler.done()
+        await _leave(socket, handler)
+
+    run(scenario)
+
+
+def test_public_wishlist_room_is_open_and_unknown_id_is_rejected(run, make_wishlist):
+    wishlist = make_wishlist(items=1)
+
+    async def scenario():
+        socket, handler = await _join(wishlist.id)
+        assert socket.accepted
+        await _leave(socket, handler)
+
+        socket, handler = await _join(wishlist.id + 100_000)
+        assert handler.done() and socket.closed_with == 1008
+
+    run(scenario)
+
+
+def test_events_carry_ids_and_totals_only(run, make_wishlist):
+    wishlist = make_wishlist(items=1, allow_group_funding=True)
+    item_id = wishlist.items[0].id
+
+    async def scenario():
+        socket, handler = await _join(wishlist.id)
+        async with api_client() as client:
+            reserve = await client.post(
+                f"/items/{item_id}/reserve", json={"reserver_name": "Secret Santa", "message": "hi"}
+            )
+            contribute = await client.post(
+                f"/items/{item_id}/contributions", json={"contributor_name": "Secret Santa", "amount_cents": 300}
+            )
+        reserved, contributed = await socket.wait_messages(2)
+        await _leave(socket, handler)
+
+        assert reserved == {
+            "type": "item_reserved",
+            "item_id": item_id,
+            "reservation_id": reserve.json()["id"],
+            "reservation_count": 1,
+            "seq": reserved["seq"],
+        }
+        assert contributed == {
+            "type": "contribution_added",
+            "item_id": item_id,
+            "reservation_id": contributed["reservation_id"],
+            "contribution_id": contribute.json()["id"],
+            "reservation_count": 2,
+            "contribution_count": 1,
+            "collected_amount_cents": 300,
+            "seq": contributed["seq"],
+        }
+        assert "Secret Santa" not in "".join(socket.sent)
+
+    run(scenario)
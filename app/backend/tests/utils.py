@@ -0,0 +1,55 @@
+"""Помощники для тестов; импортируются после conftest, когда окружение уже задано."""
+
+import asyncio
+import json
+from typing import Optional
+
+import httpx
+import pytest
+
+from app.core.security import create_access_token
+from app.db import engine
+from app.main import app
+from app.models import User
+
+
+requires_postgres = pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="нужен PostgreSQL (TEST_DATABASE_URL)"
+)
+
+
+def api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def auth_headers(user: User) -> dict:
+    token = create_access_token({"sub": user.email, "uid": user.id})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class FakeWebSocket:
+    """Сокет для ConnectionManager; stalled=True — клиент, который перестал читать."""
+
+    def __init__(self, stalled: bool = False) -> None:
+        self.stalled = stalled
+        self.sent: list[str] = []
+        self.closed_with: Optional[int] = None
+        self.received = asyncio.Event()
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(text)
+        self.received.set()
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+    async def wait_messages(self, count: int) -> list[dict]:
+        while len(self.sent) < count:
+            self.received.clear()
+            await asyncio.wait_for(self.received.wait(), timeout=2)
+        return [json.loads(text) for text in self.sent]
@@ -5,7 +5,7 @@ import { useParams } from "next/navigation";
 import Image from "next/image";
 
 import { getApiUrl } from "@/lib/api";
-import { createWishlistSocket } from "@/lib/ws";
+import { createWishlistSocket, handleHeartbeat } from "@/lib/ws";
 
 interface Contribution {
   id: number;
@@ -89,16 +89,18 @@ export default function PublicWishlistPage() {
     let cancelled = false;
     const connect = () => {
       if (cancelled) return;
-      ws = createWishlistSocket(wishlist.id);
-      ws.onmessage = async () => {
+      const socket = createWishlistSocket(wishlist.id);
+      ws = socket;
+      socket.onmessage = async (event) => {
+        if (handleHeartbeat(socket, event)) return;
         await loadWishlist();
         setJustUpdated(true);
         setTimeout(() => setJustUpdated(false), 2000);
       };
-      ws.onclose = () => {
+      socket.onclose = () => {
         if (!cancelled) setTimeout(connect, 3000);
       };
-      ws.onerror = () => {};
+      socket.onerror = () => {};
     };
     connect();
     return () => {
@@ -4,7 +4,7 @@ import { useEffect, useState } from "react";
 import { useParams } from "next/navigation";
 import Image from "next/image";
 
-import { createWishlistSocket } from "@/lib/ws";
+import { createWishlistSocket, handleHeartbeat } from "@/lib/ws";
 import { getApiUrl } from "@/lib/api";
 
 interface Item {
@@ -91,12 +91,15 @@ export default function WishlistOwnerPage() {
     let cancelled = false;
     const connect = () => {
       if (cancelled) return;
-      ws = createWishlistSocket(wishlistId);
-      ws.onmessage = () => load();
-      ws.onclose = () => {
+      const socket = createWishlistSocket(wishlistId, window.localStorage.getItem("token"));
+      ws = socket;
+      socket.onmessage = (event) => {
+        if (!handleHeartbeat(socket, event)) load();
+      };
+      socket.onclose = () => {
         if (!cancelled) setTimeout(connect, 3000);
       };
-      ws.onerror = () => {};
+      socket.onerror = () => {};
     };
     connect();
 
@@ -6,9 +6,29 @@ const getWsBase = () => {
   return api.replace(/^http/, "ws") + "/ws/wishlists";
 };
 
-export function createWishlistSocket(wishlistId: number) {
+/**
+ * Сокет комнаты вишлиста. Закрытый вишлист слушает только владелец:
+ * браузер не даёт передать заголовки, поэтому токен уходит в query.
+ */
+export function createWishlistSocket(wishlistId: number, token?: string | null) {
   const base = getWsBase();
-  const url = `${base}/${wishlistId}`;
-  return new WebSocket(url);
+  const query = token ? `?token=${encodeURIComponent(token)}` : "";
+  return new WebSocket(`${base}/${wishlistId}${query}`);
 }
 
+/**
+ * Отвечает на heartbeat сервера. true — сообщение служебное, данные перезагружать не нужно.
+ */
+export function handleHeartbeat(ws: WebSocket, event: MessageEvent): boolean {
+  if (typeof event.data !== "string") return false;
+  try {
+    const message = JSON.parse(event.data);
+    if (message?.type === "ping") {
+      ws.send(JSON.stringify({ type: "pong" }));
+      return true;
+    }
+  } catch {
+    // не JSON — обычное сообщение
+  }
+  return false;
+}